@@ -0,0 +1,87 @@
+"""
+In-memory index of cars currently parked (plate -> parking_logs id and entry_time).
+
+Warmed from parking_logs at startup and kept current by the entry/exit handlers, so gate checks are a dict lookup.
+Misses (and stale hits, e.g. a row closed by hand in MySQL or by another worker) fall back to an indexed query on
+(plate, exit_time, entry_time), which only touches the plate's open rows rather than its whole history.
+"""
+
+import threading
+
+ACTIVE_INDEX_NAME = 'idx_logs_active'
+ACTIVE_INDEX_COLUMNS = 'plate, exit_time, entry_time'
+
+
+class ActiveSessions:
+    """Thread-safe plate -> (log_id, entry_time) map of open parking sessions."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0}
+        self.warmed = False
+
+    def warm(self, cursor):
+        """Load every open session. Oldest first, so the latest entry wins for a plate with several."""
+        cursor.execute(
+            "SELECT plate, id, entry_time FROM parking_logs WHERE exit_time IS NULL ORDER BY entry_time, id"
+        )
+        sessions = {plate: (log_id, entry_time) for plate, log_id, entry_time in cursor.fetchall()}
+        with self._lock:
+            self._sessions = sessions
+            self.warmed = True
+        return len(sessions)
+
+    def get(self, plate):
+        """(log_id, entry_time) of the plate's open session, or None if it is not known to be parked."""
+        with self._lock:
+            session = self._sessions.get(plate)
+            self._stats['hits' if session else 'misses'] += 1
+        return session
+
+    def add(self, plate, log_id, entry_time):
+        with self._lock:
+            self._sessions[plate] = (log_id, entry_time)
+
+    def remove(self, plate, log_id=None, stale=False):
+        """Forget a plate's session (only if it is still `log_id`, when given)."""
+        with self._lock:
+            session = self._sessions.get(plate)
+            if session and (log_id is None or session[0] == log_id):
+                del self._sessions[plate]
+            if stale:
+                self._stats['stale'] += 1
+
+    def find(self, cursor, plate, verify=False):
+        """
+        Open session for a plate: the map first, then the (plate, exit_time) index. Caches what it finds.
+
+        verify=True confirms a map hit with a primary key lookup before trusting it, for callers that would otherwise
+        refuse the plate (the entry check); a hit whose row was closed elsewhere is dropped and the index is queried.
+        """
+        session = self.get(plate)
+        if session and verify:
+            cursor.execute("SELECT 1 FROM parking_logs WHERE id=%s AND exit_time IS NULL", (session[0],))
+            if not cursor.fetchone():
+                self.remove(plate, session[0], stale=True)
+                session = None
+        if session:
+            return session
+        cursor.execute(
+            "SELECT id, entry_time FROM parking_logs WHERE plate=%s AND exit_time IS NULL "
+            "ORDER BY entry_time DESC LIMIT 1",
+            (plate,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        session = (row[0], row[1]) if isinstance(row, tuple) else (row['id'], row['entry_time'])
+        self.add(plate, *session)
+        return session
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active'] = len(self._sessions)
+        stats['warmed'] = self.warmed
+        return stats
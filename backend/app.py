@@ -1,39 +1,96 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Request, Response, request, jsonify, render_template, send_from_directory
 import mysql.connector
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import os
+import itertools
 import uuid
+import zipfile
 # Import ML plate recognition
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), 'model'))
+from model_registry import registry
+from LPD2 import decode_image_bytes, process_image_array, process_image_arrays, process_image_bytes, result_cache
+from batcher import MicroBatcher
+from stage_metrics import stage_metrics
+from db import ConnectionPool, db_config_from_env, ensure_index
+import stats
+import plate_search
+from active_sessions import ActiveSessions, ACTIVE_INDEX_NAME, ACTIVE_INDEX_COLUMNS
+from jobs import JobQueue, QueueFull
+from events import EventBroadcaster, TooManySubscribers
+
+class UploadRequest(Request):
+    """Request whose body limit is MAX_CONTENT_LENGTH, except for /upload-bulk which may send up to BULK_MAX_MB."""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'upload_bulk':
+            return BULK_MAX_CONTENT_LENGTH
+        return super().max_content_length
 
 app = Flask(__name__, template_folder='../frontend/templates')
+app.request_class = UploadRequest
 
 # Configuration
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB max file size
+BULK_MAX_IMAGES = int(os.environ.get('BULK_MAX_IMAGES', '500'))
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '16'))
+# Total uncompressed size of the images in a bulk upload's zip, checked before anything is decompressed
+BULK_MAX_EXPANDED_MB = int(os.environ.get('BULK_MAX_EXPANDED_MB', '500'))
+BULK_MAX_EXPANDED = BULK_MAX_EXPANDED_MB * 1024 * 1024
+# Only /upload-bulk accepts bodies larger than one image (see UploadRequest)
+BULK_MAX_MB = int(os.environ.get('BULK_MAX_MB', '200'))
+BULK_MAX_CONTENT_LENGTH = BULK_MAX_MB * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_IMAGE_SIZE
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+# Uploads are recognized in memory; set SAVE_UPLOADS=1 to also keep a copy for auditing
+app.config['SAVE_UPLOADS'] = os.environ.get('SAVE_UPLOADS', '0') == '1'
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+if app.config['SAVE_UPLOADS']:
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# MySQL config
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'ppsmisZzz23@!',
-    'database': 'parking_db'
-}
+# Audit copies are written off the request thread
+audit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-audit')
+
+# MySQL config (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME) and connection pool
+db_config = db_config_from_env()
+db_pool = ConnectionPool(
+    db_config,
+    size=int(os.environ.get('DB_POOL_SIZE', '5')),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', '5')),
+    validate=os.environ.get('DB_POOL_VALIDATE', '1') == '1'
+)
+
+# Open parking sessions by plate, so entry/exit checks do not query the plate's history
+active_sessions = ActiveSessions()
+
+# Concurrent recognitions are grouped into one detector + OCR batch; BATCH_WINDOW_MS=0 runs each on its own
+BATCH_WINDOW_MS = float(os.environ.get('BATCH_WINDOW_MS', '10'))
+plate_batcher = MicroBatcher(process_image_arrays, max_batch=int(os.environ.get('BATCH_MAX_SIZE', '8')),
+                             window_ms=BATCH_WINDOW_MS, name='plate-batcher')
+
+# Live dashboard feed (/events): entry/exit changes are pushed to open dashboards instead of being polled for
+dashboard_events = EventBroadcaster(max_subscribers=int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', '100')))
+
+# Set STAGE_TIMING_HEADER=1 to return each request's stage timings in a Server-Timing header (debugging)
+app.config['STAGE_TIMING_HEADER'] = os.environ.get('STAGE_TIMING_HEADER', '0') == '1'
+
+# Dashboard counters are recomputed from parking_logs this often (seconds) to correct drift
+STATS_REFRESH_SECONDS = int(os.environ.get('STATS_REFRESH_SECONDS', '300'))
 
 # Fare calculation constants
 BASE_FARE = 20
 RATE_PER_MIN = 1
 
 def get_db():
+    # Borrow a pooled connection; db.close() hands it back to the pool
     try:
-        return mysql.connector.connect(**db_config)
+        return db_pool.connect()
     except mysql.connector.Error as err:
         print(f"Database connection error: {err}")
         return None
@@ -42,6 +99,22 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def _write_upload(data, file_path):
+    try:
+        with open(file_path, 'wb') as f:
+            f.write(data)
+    except OSError as e:
+        print(f"Upload audit error: {e}")
+
+def save_upload_async(data, filename):
+    """Persist an upload for auditing without blocking the request (only when SAVE_UPLOADS is enabled)."""
+    if not app.config['SAVE_UPLOADS']:
+        return None
+    unique_filename = f"{uuid.uuid4()}_{secure_filename(filename)}"
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    audit_executor.submit(_write_upload, data, file_path)
+    return file_path
+
 def mock_plate_recognition(image_path):
     """Mock function to simulate license plate recognition"""
     # For testing, always return the same plate so entry and exit match
@@ -94,6 +167,20 @@ def init_db():
             FROM parking_logs
         """)
         
+        # Covering indexes for keyset-paginated log browsing (newest first, optionally by status or plate);
+        # idx_logs_status_keyset serves active pages, completed pages walk idx_logs_keyset
+        ensure_index(cursor, 'parking_logs', 'idx_logs_keyset', 'entry_time, id, exit_time, plate, fare')
+        ensure_index(cursor, 'parking_logs', 'idx_logs_status_keyset', 'exit_time, entry_time, id')
+        ensure_index(cursor, 'parking_logs', 'idx_logs_plate_keyset', 'plate, entry_time, id')
+        # Open-session lookup by plate for the entry/exit gates
+        ensure_index(cursor, 'parking_logs', ACTIVE_INDEX_NAME, ACTIVE_INDEX_COLUMNS)
+
+        # Plate search index (backfilled from parking_logs on first run)
+        plate_search.ensure_schema(cursor)
+
+        # Running dashboard counters, rebuilt from parking_logs below
+        stats.ensure_schema(cursor)
+
         # Create default admin user if not exists
         cursor.execute("SELECT id FROM users WHERE username = 'admin'")
         if not cursor.fetchone():
@@ -104,7 +191,9 @@ def init_db():
             )
         
         db.commit()
+        active_sessions.warm(cursor)
         cursor.close()
+        stats.recompute(db)
         return True
         
     except mysql.connector.Error as err:
@@ -181,144 +270,467 @@ def login():
     finally:
         db.close()
 
-@app.route('/upload-entry', methods=['POST'])
-def upload_entry():
+def read_upload():
+    """Validate and read the 'image' upload. Returns (data, None), or (None, error response)."""
     if 'image' not in request.files:
-        return jsonify({'error': 'No image file was provided'}), 400
+        return None, (jsonify({'error': 'No image file was provided'}), 400)
 
     file = request.files['image']
     if file.filename == '':
-        return jsonify({'error': 'No file was selected'}), 400
+        return None, (jsonify({'error': 'No file was selected'}), 400)
 
     if not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file type. Allowed types are: JPG, PNG, GIF'}), 400
+        return None, (jsonify({'error': 'Invalid file type. Allowed types are: JPG, PNG, GIF'}), 400)
 
     try:
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-    except Exception as e:
-        return jsonify({'error': 'Failed to save uploaded file. Please try again.'}), 500
-
-    # Run ML plate recognition using process_image_file
-    try:
-        from LPD2 import process_image_file
-        plate = process_image_file(file_path)
-        if not plate:
-            return jsonify({'error': 'Plate could not be detected.'}), 422
+        # Read the upload straight from the request stream
+        with stage_metrics.stage('upload_read'):
+            data = file.read(MAX_IMAGE_SIZE + 1)
     except Exception as e:
-        return jsonify({'error': f'Plate recognition error: {str(e)}'}), 422
-
+        return None, (jsonify({'error': 'Failed to read uploaded file. Please try again.'}), 500)
+    if len(data) > MAX_IMAGE_SIZE:
+        return None, (jsonify({'error': 'File too large. Maximum size is 5MB.'}), 413)
+    with stage_metrics.stage('upload_save'):
+        save_upload_async(data, file.filename)
+    return data, None
+
+def publish_log_event(kind, cursor, log):
+    """Push a committed entry/exit (formatted like a /get-logs row) and the updated stats to open dashboards."""
+    event = {'log': log}
+    # Always published so the event gets an id and a history slot for dashboards that reconnect with
+    # Last-Event-ID; only the stats query is skipped while nobody is listening
+    if dashboard_events.has_subscribers():
+        try:
+            row = stats.read_stats(cursor)
+            if row:
+                event['stats'] = format_stats(row)
+        except mysql.connector.Error as err:
+            print(f"Event stats error: {err}")
+    dashboard_events.publish(kind, event)
+
+def compute_fare(duration_min):
+    # Fare logic: under 30 min is free, 30 min or more costs 1000 MMK
+    if duration_min < 30:
+        return 0
+    return 1000
+
+def record_entry(plate):
+    """Record a vehicle entry. Returns a (response body, HTTP status) pair."""
     entry_time = datetime.now()
     db = get_db()
     if not db:
-        return jsonify({'error': 'Database connection failed. Please try again later.'}), 503
+        return {'error': 'Database connection failed. Please try again later.'}, 503
 
     try:
         cursor = db.cursor(dictionary=True)
-        # Check for active parking log for this plate
-        cursor.execute("SELECT id FROM parking_logs WHERE plate=%s AND exit_time IS NULL", (plate,))
-        existing = cursor.fetchone()
+        # Check for active parking log for this plate (in-memory map, then the open-session index)
+        existing = active_sessions.find(cursor, plate, verify=True)
         if existing:
             cursor.close()
-            db.close()
-            return jsonify({'error': 'This car is already parked and has not exited yet.'}), 409
+            return {'error': 'This car is already parked and has not exited yet.'}, 409
 
         # Insert new entry
         cursor.execute(
             "INSERT INTO parking_logs (plate, entry_time) VALUES (%s, %s)",
             (plate, entry_time)
         )
+        log_id = cursor.lastrowid
+        stats.record_entry(cursor, entry_time)
+        plate_search.index_plate(cursor, plate)
         db.commit()
+        active_sessions.add(plate, log_id, entry_time)
+        publish_log_event('entry', cursor, {
+            'plate': plate,
+            'entry': entry_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'exit': None,
+            'duration': '-',
+            'fare': '-'
+        })
         cursor.close()
-        return jsonify({
+        return {
             'plate': plate,
             'status': 'Entry recorded successfully',
             'timestamp': entry_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
+        }, 200
     except Exception as e:
-        return jsonify({'error': 'Database error. Please try again later.'}), 503
+        return {'error': 'Database error. Please try again later.'}, 503
     finally:
         db.close()
 
-# Vehicle exit endpoint
-@app.route('/upload-exit', methods=['POST'])
-def upload_exit():
-    if 'image' not in request.files:
-        return jsonify({'error': 'No image file was provided'}), 400
-
-    file = request.files['image']
-    if file.filename == '':
-        return jsonify({'error': 'No file was selected'}), 400
-
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'Invalid file type. Allowed types are: JPG, PNG, GIF'}), 400
-
-    try:
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-    except Exception as e:
-        return jsonify({'error': 'Failed to save uploaded file. Please try again.'}), 500
-
-    # Run ML plate recognition using process_image_file
-    try:
-        from LPD2 import process_image_file
-        plate = process_image_file(file_path)
-        if not plate:
-            return jsonify({'error': 'Plate could not be detected.'}), 422
-    except Exception as e:
-        return jsonify({'error': f'Plate recognition error: {str(e)}'}), 422
-
+def record_exit(plate):
+    """Record a vehicle exit and its fare. Returns a (response body, HTTP status) pair."""
     exit_time = datetime.now()
     db = get_db()
     if not db:
-        return jsonify({'error': 'Database connection failed. Please try again later.'}), 503
+        return {'error': 'Database connection failed. Please try again later.'}, 503
 
     try:
         cursor = db.cursor(dictionary=True)
-        # Find the latest entry for this plate with no exit_time
-        cursor.execute("SELECT id, entry_time FROM parking_logs WHERE plate=%s AND exit_time IS NULL ORDER BY entry_time DESC LIMIT 1", (plate,))
-        log = cursor.fetchone()
-        if not log:
-            cursor.close()
-            db.close()
-            return jsonify({'error': 'No car found for this plate number.'}), 404
-
-        entry_time = log['entry_time']
-        duration_min = int((exit_time - entry_time).total_seconds() // 60)
-        # Fare logic: under 30 min is free, 30 min or more costs 1000 MMK
-        if duration_min < 30:
-            fare = 0
+        # Find the latest entry for this plate with no exit_time (in-memory map, then the open-session index)
+        for _ in range(2):
+            session = active_sessions.find(cursor, plate)
+            if not session:
+                cursor.close()
+                return {'error': 'No car found for this plate number.'}, 404
+
+            log_id, entry_time = session
+            duration_min = int((exit_time - entry_time).total_seconds() // 60)
+            fare = compute_fare(duration_min)
+
+            # Update log with exit_time and fare; no row means the cached session was already closed elsewhere
+            cursor.execute("UPDATE parking_logs SET exit_time=%s, fare=%s WHERE id=%s AND exit_time IS NULL",
+                           (exit_time, fare, log_id))
+            if cursor.rowcount:
+                break
+            active_sessions.remove(plate, log_id, stale=True)
         else:
-            fare = 1000
-
-        # Update log with exit_time and fare
-        cursor.execute("UPDATE parking_logs SET exit_time=%s, fare=%s WHERE id=%s", (exit_time, fare, log['id']))
+            cursor.close()
+            return {'error': 'No car found for this plate number.'}, 404
+        stats.record_exit(cursor, duration_min, fare)
         db.commit()
+        active_sessions.remove(plate, log_id)
+        publish_log_event('exit', cursor, {
+            'plate': plate,
+            'entry': entry_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'exit': exit_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': f'{duration_min} min' if duration_min else '-',
+            'fare': f'{fare:.2f} MMK'
+        })
         cursor.close()
-        db.close()
-        return jsonify({
+        return {
             'plate': plate,
             'status': 'Exit recorded successfully',
             'timestamp': exit_time.strftime('%Y-%m-%d %H:%M:%S'),
             'duration_min': duration_min,
             'fare': f'{fare} MMK'
-        })
+        }, 200
     except Exception as e:
-        return jsonify({'error': 'Database error. Please try again later.'}), 503
+        return {'error': 'Database error. Please try again later.'}, 503
+    finally:
+        db.close()
+
+RECORDERS = {'entry': record_entry, 'exit': record_exit}
+
+def recognize_image_bytes(data):
+    # Resubmitted frames are answered from the result cache; the rest go through the micro-batcher
+    return process_image_bytes(data, recognize=plate_batcher.submit if BATCH_WINDOW_MS > 0 else process_image_array)
+
+def process_upload(kind, data):
+    """Recognize the plate in an uploaded image and record the entry or exit. Returns (body, HTTP status)."""
+    # Run ML plate recognition on the in-memory image
+    try:
+        # Includes any wait for the micro-batcher; the model stages are timed inside the pipeline
+        with stage_metrics.stage('recognize'):
+            plate = recognize_image_bytes(data)
+        if not plate:
+            return {'error': 'Plate could not be detected.'}, 422
+    except Exception as e:
+        return {'error': f'Plate recognition error: {str(e)}'}, 422
+    with stage_metrics.stage('db'):
+        return RECORDERS[kind](plate)
+
+def models_unavailable():
+    """503 while the models are not loaded; (re)starts loading, which backs off after a failed attempt."""
+    registry.start()
+    if registry.status()['status'] == 'failed':
+        return jsonify({'error': 'Plate recognition is unavailable: the models failed to load.'}), 503
+    return jsonify({'error': 'Plate recognition models are still loading. Please try again shortly.'}), 503
+
+def upload_response(kind):
+    with stage_metrics.stage(f'upload_{kind}'):
+        return _upload_response(kind)
+
+def _upload_response(kind):
+    data, error = read_upload()
+    if error:
+        return error
+    if not registry.ready:
+        return models_unavailable()
+    body, status = process_upload(kind, data)
+    return jsonify(body), status
+
+@app.route('/upload-entry', methods=['POST'])
+def upload_entry():
+    return upload_response('entry')
+
+# Vehicle exit endpoint
+@app.route('/upload-exit', methods=['POST'])
+def upload_exit():
+    return upload_response('exit')
+
+def bulk_member_readable(info):
+    return allowed_file(info.filename) and info.file_size <= MAX_IMAGE_SIZE
+
+def open_bulk_upload():
+    """
+    Check a bulk upload against BULK_MAX_IMAGES and BULK_MAX_EXPANDED_MB using only the form and the zip's central
+    directory, before any image is read or decompressed. Returns (lazy iterator of (filename, data), None) or
+    (None, error response), like read_upload.
+    """
+    files = request.files.getlist('images')
+    archive = request.files.get('archive')
+    zf, members = None, []
+    if archive and archive.filename:
+        zf = zipfile.ZipFile(archive.stream)
+        members = [info for info in zf.infolist() if not info.is_dir()]
+    error = None
+    if not files and not members:
+        error = jsonify({'error': 'No images were provided'}), 400
+    elif len(files) + len(members) > BULK_MAX_IMAGES:
+        error = jsonify({'error': f'At most {BULK_MAX_IMAGES} images per bulk upload'}), 413
+    elif sum(info.file_size for info in members if bulk_member_readable(info)) > BULK_MAX_EXPANDED:
+        error = jsonify({'error': f'Archive images expand to more than {BULK_MAX_EXPANDED_MB}MB'}), 413
+    if error:
+        if zf:
+            zf.close()
+        return None, error
+    return iter_bulk_images(files, zf, members), None
+
+def iter_bulk_images(files, zf, members):
+    """
+    (filename, data) for every image of a bulk upload, read (and decompressed) only as it is consumed.
+    Files that are not images or exceed MAX_IMAGE_SIZE are yielded with data=None.
+    """
+    try:
+        for file in files:
+            if not allowed_file(file.filename):
+                yield file.filename, None
+                continue
+            data = file.read(MAX_IMAGE_SIZE + 1)
+            yield file.filename, data if len(data) <= MAX_IMAGE_SIZE else None
+        for info in members:
+            data = None
+            if bulk_member_readable(info):
+                try:
+                    data = zf.read(info)
+                except Exception:
+                    pass  # Corrupt, encrypted or unsupported member: reported like an unreadable image
+            yield info.filename, data
     finally:
+        if zf:
+            zf.close()
+
+def recognize_arrays(imgs):
+    """
+    Plates for a batch of decoded images. If the batch fails it is retried one image at a time, so only the image
+    that broke it gets the error; failed images come back as the exception instead of a plate.
+    """
+    try:
+        return process_image_arrays(imgs)
+    except Exception:
+        if len(imgs) == 1:
+            raise
+    plates = []
+    for img in imgs:
         try:
-            if 'cursor' in locals():
-                cursor.close()
-            if 'db' in locals():
-                db.close()
-        except:
-            pass
+            plates.append(process_image_arrays([img])[0])
+        except Exception as e:
+            plates.append(e)
+    return plates
+
+def recognize_bulk(images):
+    """
+    Recognize plates chunk by chunk with batched detection and OCR; returns one result dict per image.
+    Images are read and decoded a chunk at a time, so at most BULK_BATCH_SIZE of them are held in memory.
+    """
+    results = []
+    images = iter(images)
+    while True:
+        chunk = list(itertools.islice(images, BULK_BATCH_SIZE))
+        if not chunk:
+            break
+        decoded = [(name, decode_image_bytes(data) if data else None) for name, data in chunk]
+        del chunk
+        valid = [img for name, img in decoded if img is not None]
+        try:
+            plates = iter(recognize_arrays(valid) if valid else [])
+        except Exception as e:
+            plates = iter([e] * len(valid))
+        for name, img in decoded:
+            if img is None:
+                results.append({'file': name, 'status': 400, 'error': 'Not a readable JPG, PNG or GIF image'})
+                continue
+            plate = next(plates)
+            if isinstance(plate, Exception):
+                results.append({'file': name, 'status': 422, 'error': f'Plate recognition error: {str(plate)}'})
+            elif plate:
+                results.append({'file': name, 'status': 200, 'plate': plate})
+            else:
+                results.append({'file': name, 'status': 422, 'error': 'Plate could not be detected.'})
+    return results
+
+def record_bulk_entries(cursor, results, entry_time):
+    recognized = [r for r in results if r['status'] == 200]
+    plates = []
+    for r in recognized:
+        if r['plate'] in plates or active_sessions.find(cursor, r['plate'], verify=True):
+            r.update(status=409, error='This car is already parked and has not exited yet.')
+        else:
+            plates.append(r['plate'])
+            r.update(status=200, timestamp=entry_time.strftime('%Y-%m-%d %H:%M:%S'))
+    if not plates:
+        return []
+    cursor.executemany("INSERT INTO parking_logs (plate, entry_time) VALUES (%s, %s)",
+                       [(plate, entry_time) for plate in plates])
+    stats.record_entry(cursor, entry_time, count=len(plates))
+    plate_search.index_plates(cursor, plates)
+    placeholders = ', '.join(['%s'] * len(plates))
+    cursor.execute(f"SELECT plate, id FROM parking_logs WHERE plate IN ({placeholders}) "
+                   f"AND exit_time IS NULL AND entry_time = %s", (*plates, entry_time))
+    return [(row['plate'], row['id'], entry_time) for row in cursor.fetchall()]
+
+def record_bulk_exits(cursor, results, exit_time):
+    sessions = {}
+    for r in results:
+        if r['status'] != 200:
+            continue
+        session = None if r['plate'] in sessions else active_sessions.find(cursor, r['plate'])
+        if not session:
+            r.update(status=404, error='No car found for this plate number.')
+            continue
+        sessions[r['plate']] = (r, session)
+    if not sessions:
+        return []
+    # Drop sessions closed outside this process (the in-memory map may be stale) and lock the rest
+    ids = [session[0] for r, session in sessions.values()]
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"SELECT id FROM parking_logs WHERE id IN ({placeholders}) AND exit_time IS NULL FOR UPDATE",
+                   tuple(ids))
+    open_ids = {row['id'] for row in cursor.fetchall()}
+    updates, exits, closed = [], [], []
+    for plate, (r, (log_id, entry_time)) in sessions.items():
+        if log_id not in open_ids:
+            active_sessions.remove(plate, log_id, stale=True)
+            r.update(status=404, error='No car found for this plate number.')
+            continue
+        duration_min = int((exit_time - entry_time).total_seconds() // 60)
+        fare = compute_fare(duration_min)
+        updates.append((exit_time, fare, log_id))
+        exits.append((duration_min, fare))
+        closed.append((plate, log_id))
+        r.update(timestamp=exit_time.strftime('%Y-%m-%d %H:%M:%S'), duration_min=duration_min, fare=f'{fare} MMK')
+    if updates:
+        cursor.executemany("UPDATE parking_logs SET exit_time=%s, fare=%s WHERE id=%s AND exit_time IS NULL", updates)
+        stats.record_exits(cursor, exits)
+    return closed
+
+@app.route('/upload-bulk', methods=['POST'])
+def upload_bulk():
+    """
+    Record many entries or exits at once: form field kind=entry|exit plus several 'images' files and/or an
+    'archive' zip of images. Plates are recognized in batches and all rows are written in one transaction.
+    Returns a result (file, status, plate or error) per image.
+    """
+    kind = request.form.get('kind', 'entry')
+    if kind not in RECORDERS:
+        return jsonify({'error': "kind must be 'entry' or 'exit'"}), 400
+    if not registry.ready:
+        return models_unavailable()
+    try:
+        images, error = open_bulk_upload()
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'archive must be a zip file'}), 400
+    if error:
+        return error
+
+    try:
+        with stage_metrics.stage('bulk_recognize'):
+            results = recognize_bulk(images)
+    finally:
+        images.close()
+
+    # Whole seconds, as stored in DATETIME, so the inserted entries can be selected back by entry_time
+    now = datetime.now().replace(microsecond=0)
+    db = get_db()
+    if not db:
+        return jsonify({'error': 'Database connection failed. Please try again later.'}), 503
+    try:
+        cursor = db.cursor(dictionary=True)
+        with stage_metrics.stage('bulk_db'):
+            if kind == 'entry':
+                opened = record_bulk_entries(cursor, results, now)
+                db.commit()
+                for plate, log_id, entry_time in opened:
+                    active_sessions.add(plate, log_id, entry_time)
+            else:
+                closed = record_bulk_exits(cursor, results, now)
+                db.commit()
+                for plate, log_id in closed:
+                    active_sessions.remove(plate, log_id)
+        cursor.close()
+    except mysql.connector.Error as err:
+        db.rollback()
+        print(f"Bulk upload error: {err}")
+        return jsonify({'error': 'Database error. Please try again later.'}), 503
+    finally:
+        db.close()
+
+    recorded = sum(1 for r in results if r['status'] == 200)
+    if recorded:
+        # Open dashboards reload once instead of receiving one event per row
+        dashboard_events.publish('resync', {})
+    return jsonify({'kind': kind, 'total': len(results), 'recorded': recorded, 'results': results})
+
+def run_recognition_job(kind, data):
+    # Workers wait for the models instead of rejecting jobs queued during startup
+    try:
+        registry.ensure_loaded()
+    except Exception as e:
+        return {'error': f'Plate recognition models failed to load: {e}'}, 503
+    return process_upload(kind, data)
+
+# Recognition jobs: a bounded queue served by a fixed pool of inference workers sharing the loaded models
+recognition_jobs = JobQueue(
+    run_recognition_job,
+    workers=int(os.environ.get('JOB_WORKERS', '2')),
+    max_queue=int(os.environ.get('JOB_QUEUE_SIZE', '64')),
+    result_ttl=int(os.environ.get('JOB_RESULT_TTL', '300'))
+)
+JOB_MAX_WAIT_SECONDS = 30
+
+@app.route('/jobs/<kind>', methods=['POST'])
+def submit_job(kind):
+    """Queue an entry or exit upload for recognition; returns 202 with the job id to poll."""
+    if kind not in RECORDERS:
+        return jsonify({'error': "Job kind must be 'entry' or 'exit'"}), 404
+    data, error = read_upload()
+    if error:
+        return error
+    try:
+        job = recognition_jobs.submit(kind, data)
+    except QueueFull:
+        response = jsonify({'error': 'Recognition queue is full. Please try again shortly.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    body = job.to_dict()
+    body['poll'] = f'/jobs/{job.id}'
+    return jsonify(body), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and, once finished, its result. ?wait=<seconds> long-polls until the job finishes."""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), JOB_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    job = recognition_jobs.wait(job_id, wait)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify(recognition_jobs.metrics())
+
+def format_stats(row):
+    return {
+        'total_vehicles': row.get('total_records', 0),
+        'active_parkings': row.get('active_parkings', 0),
+        'completed_parkings': row.get('completed_parkings', 0),
+        'total_revenue': "{:.2f}".format(float(row.get('total_revenue', 0))),
+        'avg_duration_minutes': float(row.get('avg_duration_minutes', 0)),
+        'today_entries': row.get('today_entries', 0)
+    }
 
 # Get dashboard statistics
 @app.route('/get-stats', methods=['GET'])
@@ -328,68 +740,124 @@ def get_stats():
         return jsonify({'error': 'Database connection error'}), 500
     try:
         cursor = db.cursor(dictionary=True)
-        # Custom query to ignore fares above 1000 for total_revenue
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_records,
-                SUM(CASE WHEN exit_time IS NULL THEN 1 ELSE 0 END) as active_parkings,
-                SUM(CASE WHEN exit_time IS NOT NULL THEN 1 ELSE 0 END) as completed_parkings,
-                COALESCE(SUM(CASE WHEN fare <= 1000 THEN fare ELSE 0 END), 0) as total_revenue,
-                COALESCE(AVG(TIMESTAMPDIFF(MINUTE, entry_time, exit_time)), 0) as avg_duration_minutes,
-                SUM(CASE WHEN DATE(entry_time) = CURDATE() THEN 1 ELSE 0 END) as today_entries
-            FROM parking_logs
-        """)
-        stats = cursor.fetchone()
+        # O(1): read the running counters kept up to date by the entry/exit handlers
+        row = stats.read_stats(cursor)
         cursor.close()
-        if not stats:
+        if not row:
             return jsonify({'error': 'No stats found'}), 404
-        return jsonify({
-            'total_vehicles': stats.get('total_records', 0),
-            'active_parkings': stats.get('active_parkings', 0),
-            'completed_parkings': stats.get('completed_parkings', 0),
-            'total_revenue': "{:.2f}".format(float(stats.get('total_revenue', 0))).replace(',', '').replace('.', '.'),
-            'avg_duration_minutes': float(stats.get('avg_duration_minutes', 0)),
-            'today_entries': stats.get('today_entries', 0)
-        })
+        return jsonify(format_stats(row))
     except Exception as e:
         print(f"Get stats error: {e}")
         return jsonify({'error': 'Database error'}), 500
     finally:
         db.close()
 
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-sent events stream of 'entry' and 'exit' events ({log, stats}) for the dashboard."""
+    try:
+        stream = dashboard_events.stream(request.headers.get('Last-Event-ID'))
+    except TooManySubscribers:
+        # The dashboard falls back to polling
+        return jsonify({'error': 'Too many live dashboards. Please try again later.'}), 503
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Log rows formatted by MySQL so a page is serialized in bulk; entry_time and id feed the next cursor
+LOG_PAGE_SQL = """
+    SELECT plate,
+           DATE_FORMAT(entry_time, '%%Y-%%m-%%d %%H:%%i:%%s'),
+           DATE_FORMAT(exit_time, '%%Y-%%m-%%d %%H:%%i:%%s'),
+           IF(TIMESTAMPDIFF(MINUTE, entry_time, exit_time), CONCAT(TIMESTAMPDIFF(MINUTE, entry_time, exit_time), ' min'), '-'),
+           COALESCE(CONCAT(fare, ' MMK'), '-'),
+           entry_time, id
+    FROM parking_logs
+"""
+LOG_FIELDS = ('plate', 'entry', 'exit', 'duration', 'fare')
+LOGS_PAGE_SIZE = 100
+LOGS_MAX_PAGE_SIZE = 500
+CURSOR_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+def parse_log_cursor(value):
+    # Cursor format: <entry_time>_<id> of the last row of the previous page
+    entry, _, log_id = value.rpartition('_')
+    return datetime.strptime(entry, CURSOR_TIME_FORMAT), int(log_id)
+
+def parse_date_param(value):
+    # Accept YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS; returns (datetime, is_date_only)
+    try:
+        return datetime.strptime(value, '%Y-%m-%d'), True
+    except ValueError:
+        return datetime.strptime(value, CURSOR_TIME_FORMAT), False
+
 @app.route('/get-logs', methods=['GET'])
 def get_logs():
+    """
+    Newest-first parking logs, one page at a time.
+
+    Query parameters: limit, cursor (from the X-Next-Cursor header of the previous page), from/to (dates or
+    datetimes, 'to' inclusive for dates), status (active/completed) and plate (exact).
+    """
+    conditions, params = [], []
+    try:
+        limit = min(max(int(request.args.get('limit', LOGS_PAGE_SIZE)), 1), LOGS_MAX_PAGE_SIZE)
+        cursor_value = request.args.get('cursor')
+        if cursor_value:
+            # Keyset: rows strictly after the last one already returned, in (entry_time, id) DESC order
+            cursor_time, cursor_id = parse_log_cursor(cursor_value)
+            conditions.append("(entry_time < %s OR (entry_time = %s AND id < %s))")
+            params += [cursor_time, cursor_time, cursor_id]
+        if request.args.get('from'):
+            start, _ = parse_date_param(request.args['from'])
+            conditions.append("entry_time >= %s")
+            params.append(start)
+        if request.args.get('to'):
+            end, date_only = parse_date_param(request.args['to'])
+            if date_only:
+                end += timedelta(days=1)
+                conditions.append("entry_time < %s")
+            else:
+                conditions.append("entry_time <= %s")
+            params.append(end)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, cursor or date parameter'}), 400
+
+    status = request.args.get('status')
+    index_hint = ""
+    if status == 'active':
+        conditions.append("exit_time IS NULL")
+    elif status == 'completed':
+        conditions.append("exit_time IS NOT NULL")
+        if not request.args.get('plate'):
+            # A range on exit_time cannot supply the (entry_time, id) order from idx_logs_status_keyset, so every
+            # page would filesort all completed rows; walk idx_logs_keyset in order and filter exit_time from it
+            index_hint = "FORCE INDEX (idx_logs_keyset)"
+    elif status:
+        return jsonify({'error': "status must be 'active' or 'completed'"}), 400
+    if request.args.get('plate'):
+        conditions.append("plate = %s")
+        params.append(request.args['plate'])
+
     db = get_db()
     if not db:
         return jsonify([]), 500
     
     try:
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT plate, entry_time, exit_time, 
-                   TIMESTAMPDIFF(MINUTE, entry_time, exit_time) AS duration, 
-                   fare 
-            FROM parking_logs 
-            ORDER BY entry_time DESC 
-            LIMIT 100
-        """)
-        logs = cursor.fetchall()
+        cursor = db.cursor()
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor.execute(f"{LOG_PAGE_SQL} {index_hint} {where} ORDER BY entry_time DESC, id DESC LIMIT %s",
+                       (*params, limit + 1))
+        rows = cursor.fetchall()
         cursor.close()
-        
-        # Format the data for frontend
-        formatted_logs = []
-        for log in logs:
-            formatted_log = {
-                'plate': log['plate'],
-                'entry': log['entry_time'].strftime('%Y-%m-%d %H:%M:%S') if log['entry_time'] else '-',
-                # For active parkings, set exit to null (not '-')
-                'exit': log['exit_time'].strftime('%Y-%m-%d %H:%M:%S') if log['exit_time'] else None,
-                'duration': f"{log['duration']} min" if log['duration'] else '-',
-                'fare': f"{log['fare']} MMK" if log['fare'] is not None else '-'
-            }
-            formatted_logs.append(formatted_log)
 
-        return jsonify(formatted_logs)
+        # Fetching one extra row tells whether another page exists
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        response = jsonify([dict(zip(LOG_FIELDS, row[:5])) for row in rows])
+        if has_more:
+            last_entry, last_id = rows[-1][5], rows[-1][6]
+            response.headers['X-Next-Cursor'] = f"{last_entry.strftime(CURSOR_TIME_FORMAT)}_{last_id}"
+        return response
     
     except mysql.connector.Error as err:
         print(f"Get logs error: {err}")
@@ -399,19 +867,41 @@ def get_logs():
 
 @app.route('/search-car', methods=['GET'])
 def search_car():
+    """
+    Search parking logs by plate through the plate n-gram index.
+
+    mode: exact, prefix, contains (default) or fuzzy. Fuzzy matches tolerate OCR confusions up to max_distance
+    (default 1) edits and add a 'distance' field to each row.
+    """
     plate = request.args.get('plate')
     if not plate:
         return jsonify({'error': 'Plate parameter required'}), 400
+    mode = request.args.get('mode', 'contains')
+    if mode not in plate_search.SEARCH_MODES:
+        return jsonify({'error': f"mode must be one of: {', '.join(plate_search.SEARCH_MODES)}"}), 400
+    try:
+        max_distance = float(request.args.get('max_distance', 1))
+    except ValueError:
+        return jsonify({'error': 'max_distance must be a number'}), 400
     
     db = get_db()
     if not db:
         return jsonify({'error': 'Database connection error'}), 500
     
     try:
+        cursor = db.cursor()
+        matches = plate_search.find_plates(cursor, plate, mode=mode, max_distance=max_distance)
+        cursor.close()
+        if not matches:
+            return jsonify([])
+        distances = {p.upper(): d for p, d in matches}
+
         cursor = db.cursor(dictionary=True)
+        placeholders = ', '.join(['%s'] * len(distances))
+        # Matched plates are looked up through idx_plate instead of a LIKE '%...%' table scan
         cursor.execute(
-            "SELECT plate, entry_time, exit_time, fare FROM parking_logs WHERE plate LIKE %s ORDER BY entry_time DESC",
-            (f"%{plate}%",)
+            f"SELECT plate, entry_time, exit_time, fare FROM parking_logs WHERE plate IN ({placeholders}) ORDER BY entry_time DESC",
+            tuple(p for p, d in matches)
         )
         logs = cursor.fetchall()
         cursor.close()
@@ -428,7 +918,12 @@ def search_car():
                 'exit': log['exit_time'].strftime('%Y-%m-%d %H:%M:%S') if log['exit_time'] else '-',
                 'fare': f"${log['fare']}" if log['fare'] else '-'
             }
+            if mode == 'fuzzy':
+                formatted_log['distance'] = distances.get(log['plate'].upper())
             formatted_logs.append(formatted_log)
+        if mode == 'fuzzy':
+            # Closest plates first, newest first within a plate
+            formatted_logs.sort(key=lambda log: log['distance'])
         
         return jsonify(formatted_logs)
     
@@ -438,15 +933,46 @@ def search_car():
     finally:
         db.close()
 
+@app.before_request
+def start_stage_trace():
+    if app.config['STAGE_TIMING_HEADER']:
+        stage_metrics.start_trace()
+
+@app.after_request
+def add_server_timing(response):
+    if app.config['STAGE_TIMING_HEADER']:
+        timing = stage_metrics.server_timing()
+        if timing:
+            response.headers['Server-Timing'] = timing
+    return response
+
+# Prometheus scrape endpoint: per-stage latency histograms
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(stage_metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
     db = get_db()
     if db:
         db.close()
-        return jsonify({'status': 'healthy', 'database': 'connected'})
-    else:
-        return jsonify({'status': 'unhealthy', 'database': 'disconnected'}), 503
+    health = {
+        'database': 'connected' if db else 'disconnected',
+        'models': registry.status(),
+        'pool': db_pool.metrics(),
+        'active_sessions': active_sessions.metrics(),
+        'jobs': recognition_jobs.metrics(),
+        'batching': plate_batcher.metrics(),
+        'result_cache': result_cache.metrics(),
+        'events': dashboard_events.metrics(),
+    }
+    # A model load that failed is reported as unhealthy rather than as a normal startup
+    if not db or health['models']['status'] == 'failed':
+        return jsonify(dict(health, status='unhealthy')), 503
+    if health['models']['status'] != 'ready':
+        return jsonify(dict(health, status='starting')), 503
+    return jsonify(dict(health, status='healthy'))
 
 # Error handlers
 @app.errorhandler(404)
@@ -459,7 +985,9 @@ def internal_error(error):
 
 @app.errorhandler(413)
 def file_too_large(error):
-    return jsonify({'error': 'File too large. Maximum size is 5MB.'}), 413
+    if request.endpoint == 'upload_bulk':
+        return jsonify({'error': f'Request too large. Maximum size is {BULK_MAX_MB}MB per bulk upload.'}), 413
+    return jsonify({'error': 'Request too large. Maximum size is 5MB per image.'}), 413
 
 if __name__ == '__main__':
     # Initialize database on startup
@@ -468,5 +996,13 @@ if __name__ == '__main__':
         print("Default login: admin / admin123")
     else:
         print("Warning: Database initialization failed")
+
+    # Periodically rebuild the dashboard counters to correct drift
+    stats.start_refresher(get_db, STATS_REFRESH_SECONDS)
+
+    # Load and warm up the plate models before gate traffic arrives
+    registry.start()
+    recognition_jobs.start()
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # No reloader: it re-runs this block in a child process, loading the models and the refresher twice
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Pooled MySQL connections for the Flask backend.
+
+Connections are borrowed with ConnectionPool.connect() and handed back by calling close() on them, so route code
+keeps the usual connect / cursor / commit / close pattern.
+"""
+
+import os
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import errors, pooling
+
+
+def db_config_from_env():
+    """MySQL settings from the environment (the same variables docker-compose.yml sets). DB_PASSWORD is required."""
+    password = os.environ.get('DB_PASSWORD')
+    if password is None:
+        raise RuntimeError("DB_PASSWORD is not set; export it (an empty value is allowed) before starting the backend")
+    return {
+        'host': os.environ.get('DB_HOST', 'localhost'),
+        'port': int(os.environ.get('DB_PORT', '3306')),
+        'user': os.environ.get('DB_USER', 'root'),
+        'password': password,
+        'database': os.environ.get('DB_NAME', 'parking_db'),
+    }
+
+
+def ensure_index(cursor, table, name, columns):
+    """Create an index on an existing table if it is missing (CREATE TABLE IF NOT EXISTS never adds indexes)."""
+    cursor.execute(
+        "SELECT 1 FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+        (table, name)
+    )
+    if cursor.fetchone():
+        return False
+    cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    return True
+
+
+class PooledConnection:
+    """Wraps a pooled MySQL connection; close() returns it to the pool exactly once."""
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._conn.close()
+        finally:
+            self._pool._release()
+
+
+class ConnectionPool:
+    """
+    Fixed-size MySQL connection pool with connection validation and usage metrics.
+
+    Borrowers wait up to `timeout` seconds for a free connection instead of failing immediately. The underlying
+    pool is created on first use so the app can start before MySQL is reachable.
+    """
+
+    def __init__(self, config, size=5, timeout=5.0, validate=True, name='parking_pool'):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.validate = validate
+        self.name = name
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._in_use = 0
+        self._stats = {'borrowed': 0, 'exhausted': 0, 'errors': 0, 'reconnects': 0, 'wait_seconds': 0.0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = pooling.MySQLConnectionPool(pool_name=self.name, pool_size=self.size,
+                                                         pool_reset_session=True, **self.config)
+            return self._pool
+
+    def connect(self):
+        """Borrow a validated connection. Raises mysql.connector.Error on failure."""
+        t0 = time.time()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['exhausted'] += 1
+            raise errors.PoolError(f"No database connection available within {self.timeout}s")
+        conn = None
+        try:
+            conn = self._get_pool().get_connection()
+            if self.validate:
+                self._validate(conn)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            if conn is not None:
+                # Hand the connection back to the underlying pool, or its slot is lost for good
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats['borrowed'] += 1
+            self._stats['wait_seconds'] += time.time() - t0
+            self._in_use += 1
+        return PooledConnection(conn, self)
+
+    def _validate(self, conn):
+        # Pooled connections can be dropped by the server (wait_timeout); reconnect instead of failing the request
+        try:
+            conn.ping(reconnect=False)
+        except mysql.connector.Error:
+            conn.reconnect(attempts=2, delay=0)
+            with self._lock:
+                self._stats['reconnects'] += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_use'] = self._in_use
+        stats['size'] = self.size
+        stats['available'] = self.size - stats['in_use']
+        stats['avg_wait_ms'] = round(stats['wait_seconds'] / stats['borrowed'] * 1e3, 3) if stats['borrowed'] else 0.0
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        return stats
@@ -0,0 +1,135 @@
+"""
+In-process broadcaster for the dashboard's server-sent events (/events).
+
+The entry/exit handlers publish each change once after it commits and every connected dashboard receives it from
+memory, so database load grows with the number of events rather than with dashboards x poll rate. Recent events
+are kept so a reconnecting browser (EventSource sends Last-Event-ID) can catch up without reloading.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+
+class TooManySubscribers(Exception):
+    """Raised by EventBroadcaster.subscribe when max_subscribers streams are already open."""
+
+
+class Subscription:
+    def __init__(self, broadcaster, maxsize):
+        self.broadcaster = broadcaster
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A stalled client is cut off; its browser reconnects and catches up via Last-Event-ID
+            self.overflowed = True
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class EventBroadcaster:
+    """Fan-out of published events to every open subscription, each with its own bounded queue."""
+
+    def __init__(self, max_subscribers=100, history=256, queue_size=100, heartbeat=15.0):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._history = deque(maxlen=history)
+        # Event ids are "<epoch>-<n>" so a browser reconnecting after a restart is told to resync
+        self._epoch = format(int(time.time() * 1000), 'x')
+        self._last_id = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'dropped_subscribers': 0}
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            event = (self._last_id, event_type, json.dumps(data, default=str))
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+            self._stats['published'] += 1
+            self._stats['delivered'] += len(subscribers)
+        for subscription in subscribers:
+            subscription.deliver(event)
+        return event[0]
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def _parse_event_id(self, value):
+        # Sequence number of an id from this process, or None if it comes from an earlier run or is malformed
+        epoch, _, n = (value or '').partition('-')
+        if epoch != self._epoch or not n.isdigit():
+            return None
+        return int(n)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Open a subscription. Returns (subscription, missed events, in_sync); in_sync is False when the events
+        after last_event_id (the Last-Event-ID header) can no longer be replayed and the client has to reload.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(f"{self.max_subscribers} event streams already open")
+            subscription = Subscription(self, self.queue_size)
+            self._subscribers.add(subscription)
+            missed, in_sync = [], True
+            if last_event_id:
+                last = self._parse_event_id(last_event_id)
+                oldest = self._history[0][0] if self._history else self._last_id + 1
+                in_sync = last is not None and oldest - 1 <= last <= self._last_id
+                if in_sync:
+                    missed = [event for event in self._history if event[0] > last]
+        return subscription, missed, in_sync
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.discard(subscription)
+                if subscription.overflowed:
+                    self._stats['dropped_subscribers'] += 1
+
+    def stream(self, last_event_id=None):
+        """
+        Server-sent events for one client: missed events, then live ones, with a comment line as a heartbeat so
+        proxies keep the connection open and disconnected clients are noticed.
+        """
+        subscription, missed, in_sync = self.subscribe(last_event_id)
+
+        def generate():
+            try:
+                yield 'retry: 3000\n\n'
+                if not in_sync:
+                    yield 'event: resync\ndata: {}\n\n'
+                for event in missed:
+                    yield self.format_event(event)
+                while not subscription.overflowed:
+                    try:
+                        event = subscription.queue.get(timeout=self.heartbeat)
+                    except queue.Empty:
+                        yield ': keepalive\n\n'
+                        continue
+                    yield self.format_event(event)
+            finally:
+                subscription.close()
+
+        return generate()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+        stats['max_subscribers'] = self.max_subscribers
+        return stats
+
+    def format_event(self, event):
+        n, event_type, data = event
+        return f'id: {self._epoch}-{n}\nevent: {event_type}\ndata: {data}\n\n'
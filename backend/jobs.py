@@ -0,0 +1,149 @@
+"""
+Asynchronous recognition jobs.
+
+Uploads are put on a bounded queue and processed by a fixed pool of worker threads, so a burst at several gates
+waits in the queue instead of holding request threads (and timing out) while it serializes on the model. Clients
+get a job id back and poll, or long-poll, for the result.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the queue is at capacity."""
+
+
+class Job:
+    def __init__(self, kind, payload):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.status = 'queued'
+        self.result = None
+        self.http_status = None
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        info = {'job_id': self.id, 'kind': self.kind, 'status': self.status}
+        if self.started_at is not None:
+            info['wait_ms'] = round((self.started_at - self.enqueued_at) * 1e3, 1)
+        if self.finished_at is not None:
+            info['service_ms'] = round((self.finished_at - self.started_at) * 1e3, 1)
+            info['http_status'] = self.http_status
+            info['result'] = self.result
+        return info
+
+
+class JobQueue:
+    """
+    Bounded job queue served by `workers` threads.
+
+    handler(kind, payload) runs on a worker and returns a (result, http_status) pair. Finished jobs are kept for
+    `result_ttl` seconds so clients can collect them.
+    """
+
+    def __init__(self, handler, workers=2, max_queue=64, result_ttl=300, name='recognition'):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._busy = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0,
+                       'wait_seconds': 0.0, 'service_seconds': 0.0, 'max_wait_seconds': 0.0}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'{self.name}-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, payload):
+        """Enqueue a job and return it. Raises QueueFull when max_queue jobs are already waiting."""
+        self.start()
+        job = Job(kind, payload)
+        with self._lock:
+            self._expire()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._stats['rejected'] += 1
+                raise QueueFull(f"{self.max_queue} jobs already queued")
+            self._jobs[job.id] = job
+            self._stats['submitted'] += 1
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """The job, after waiting up to `timeout` seconds for it to finish (None if unknown)."""
+        job = self.get(job_id)
+        if job is not None and timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def _expire(self):
+        # Jobs finish roughly in submission order, so expired ones are at the front
+        cutoff = time.time() - self.result_ttl
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished_at is None:
+                continue
+            if job.finished_at > cutoff:
+                break
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.started_at = time.time()
+            job.status = 'running'
+            with self._lock:
+                self._busy += 1
+            try:
+                job.result, job.http_status = self.handler(job.kind, job.payload)
+                job.status = 'done'
+            except Exception as e:
+                job.result, job.http_status = {'error': f'Job failed: {e}'}, 500
+                job.status = 'failed'
+            job.payload = None
+            job.finished_at = time.time()
+            wait, service = job.started_at - job.enqueued_at, job.finished_at - job.started_at
+            with self._lock:
+                self._busy -= 1
+                self._stats['completed' if job.status == 'done' else 'failed'] += 1
+                self._stats['wait_seconds'] += wait
+                self._stats['service_seconds'] += service
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], wait)
+            job.done.set()
+            self._queue.task_done()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['busy_workers'] = self._busy
+            stats['retained_jobs'] = len(self._jobs)
+        finished = stats['completed'] + stats['failed']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['workers'] = self.workers
+        stats['max_queue'] = self.max_queue
+        stats['avg_wait_ms'] = round(stats.pop('wait_seconds') / finished * 1e3, 1) if finished else 0.0
+        stats['avg_service_ms'] = round(stats.pop('service_seconds') / finished * 1e3, 1) if finished else 0.0
+        stats['max_wait_ms'] = round(stats.pop('max_wait_seconds') * 1e3, 1)
+        return stats
@@ -1,53 +1,145 @@
 import cv2
-import torch
 import os
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-from PIL import Image
 import re
 import numpy as np
+from PIL import Image
+from model_registry import registry
+from result_cache import ResultCache
+from stage_metrics import stage_metrics
 
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+# Myanmar plates: two-character prefix + four digits, e.g. 1E-5084 -> 1E5084
+PLATE_LENGTH = 6
+# Plate decoding profile: every plate character costs at most one token, plus room for a separator and EOS
+PLATE_MAX_NEW_TOKENS = PLATE_LENGTH + 3
 
-# Load YOLOv5 plate detector
-det_model = torch.hub.load('ultralytics/yolov5', 'custom', path='C:/Users/USER/Desktop/Car_license_plate_detection_using_CNN/backend/model/plate_detection.pt')
+# Cascade (LPD_OCR_ENGINE=cascade): accept the character CNN's reading when every character is at least this
+# confident and the plate format checks pass, otherwise escalate to TrOCR ('trocr') or the TrOCR ensemble ('ensemble')
+CASCADE_MIN_CONF = float(os.environ.get('LPD_CASCADE_MIN_CONF', '0.9'))
+CASCADE_FALLBACK = os.environ.get('LPD_CASCADE_FALLBACK', 'trocr').lower()
+cascade_stats = {'accepted': 0, 'escalated': 0}
 
-# Load TrOCR model and processor
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-processor = TrOCRProcessor.from_pretrained('microsoft/trocr-base-printed')
-model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-base-printed').to(device)
+# Recent results for resubmitted gate images, keyed by content hash (LPD_CACHE_SIZE=0 disables); matching on the
+# perceptual hash of the whole frame is opt-in (LPD_CACHE_PERCEPTUAL=1) as it can match a different car at the same gate
+result_cache = ResultCache(
+    size=int(os.environ.get('LPD_CACHE_SIZE', '256')),
+    ttl=float(os.environ.get('LPD_CACHE_TTL', '10')),
+    perceptual=os.environ.get('LPD_CACHE_PERCEPTUAL', '0') == '1',
+    max_hamming=int(os.environ.get('LPD_CACHE_MAX_HAMMING', '0'))
+)
 
 def clean_plate_string(plate_str):
     # Only keep alphanumeric characters
     return re.sub(r'[^A-Za-z0-9]', '', plate_str)
 
+_plate_vocab_cache = {}
+
+def plate_vocab_ids(tokenizer):
+    """
+    Token ids whose text is made only of A-Z / 0-9 (plus EOS), for constrained plate decoding.
+    """
+    key = id(tokenizer)
+    if key not in _plate_vocab_cache:
+        allowed = set()
+        for token, token_id in tokenizer.get_vocab().items():
+            text = tokenizer.convert_tokens_to_string([token]).strip()
+            if text and re.fullmatch(r'[A-Z0-9]+', text):
+                allowed.add(token_id)
+        allowed.add(tokenizer.eos_token_id)
+        _plate_vocab_cache[key] = sorted(allowed)
+    return _plate_vocab_cache[key]
+
+def generation_kwargs(models):
+    """
+    Decoding settings for TrOCR generate() (LPD_OCR_DECODING / LPD_OCR_CONSTRAIN_VOCAB).
+    The 'plate' profile is greedy with a token budget sized for one plate; greedy decoding already stops each
+    sequence at EOS and the batch as soon as every sequence has finished.
+    """
+    if models.ocr_decoding != 'plate':
+        return {}
+    kwargs = {'max_new_tokens': PLATE_MAX_NEW_TOKENS, 'num_beams': 1, 'do_sample': False}
+    if models.ocr_constrain_vocab:
+        allowed = plate_vocab_ids(models.processor.tokenizer)
+        if models.ocr_backend == 'onnx':
+            kwargs['allowed_token_ids'] = allowed
+        else:
+            kwargs['prefix_allowed_tokens_fn'] = lambda batch_id, input_ids: allowed
+    return kwargs
+
+def trocr_generate(rgb_images, models=None):
+    """
+    Run TrOCR on a list of RGB images (PIL or HxWx3 arrays) with one generate() call.
+    `models` defaults to the shared registry; pass another ModelRegistry to compare model variants.
+    """
+    models = models or registry.ensure_loaded()
+    # The processor resizes every image to the encoder input size, so the batch stacks into one tensor
+    with stage_metrics.stage('ocr_preprocess'):
+        pixel_values = models.processor(images=list(rgb_images), return_tensors="pt").pixel_values.to(models.ocr_device)
+    with stage_metrics.stage('ocr_generate', model=True):
+        generated_ids = models.ocr_model.generate(pixel_values, **generation_kwargs(models))
+        texts = models.processor.batch_decode(generated_ids, skip_special_tokens=True)
+    return [text.strip() for text in texts]
+
+def recognize_plates_batch(plate_crops, models=None):
+    """
+    Recognize many BGR plate crops at once, amortizing the encoder and decoding cost over the batch.
+    Returns one string per crop, in order.
+    """
+    if len(plate_crops) == 0:
+        return []
+    pil_imgs = []
+    for plate_crop in plate_crops:
+        h, w = plate_crop.shape[:2]
+        # Remove upper third (adjust as needed)
+        main_plate_crop = plate_crop[int(h*0.33):, :]
+        pil_imgs.append(Image.fromarray(cv2.cvtColor(main_plate_crop, cv2.COLOR_BGR2RGB)))
+    return trocr_generate(pil_imgs, models=models)
+
 def recognize_plate_trocr(plate_crop):
-    h, w = plate_crop.shape[:2]
-    # Remove upper third (adjust as needed)
-    main_plate_crop = plate_crop[int(h*0.33):, :]
-    pil_img = Image.fromarray(cv2.cvtColor(main_plate_crop, cv2.COLOR_BGR2RGB))
-    pixel_values = processor(images=pil_img, return_tensors="pt").pixel_values.to(device)
-    generated_ids = model.generate(pixel_values)
-    plate_text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-    return plate_text.strip()
-
-def recognize_plate_trocr_ensemble(plate_crop, n=5):
-    """
-    Run TrOCR multiple times with slight augmentations and use majority voting for each character.
-    """
-    preds = []
-    for _ in range(n):
-        # Apply random brightness/contrast augmentation
-        aug = plate_crop.copy().astype(np.float32)
-        alpha = np.random.uniform(0.9, 1.1)  # contrast
-        beta = np.random.uniform(-10, 10)    # brightness
-        aug = np.clip(alpha * aug + beta, 0, 255).astype(np.uint8)
-
-        pil_img = Image.fromarray(cv2.cvtColor(aug, cv2.COLOR_BGR2RGB))
-        pixel_values = processor(images=pil_img, return_tensors="pt").pixel_values.to(device)
-        generated_ids = model.generate(pixel_values)
-        plate_text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        preds.append(re.sub(r'[^A-Za-z0-9]', '', plate_text.strip()))
+    return recognize_plates_batch([plate_crop])[0]
+
+def recognize_plates_cnn(plate_crops, models=None):
+    """
+    Recognize plate crops with the alphanumeric character CNN. Returns (text, per-character confidences) per crop.
+    """
+    models = models or registry.ensure_loaded()
+    with stage_metrics.stage('ocr_cnn', model=True):
+        return models.char_model.recognize_batch(plate_crops)
+
+def recognize_plates(plate_crops, models=None):
+    """
+    Recognize plate crops with the OCR engine configured for this deployment (LPD_OCR_ENGINE).
+    """
+    models = models or registry.ensure_loaded()
+    if models.ocr_engine == 'cnn':
+        return [text for text, confs in recognize_plates_cnn(plate_crops, models)]
+    if models.ocr_engine == 'cascade':
+        return recognize_plates_cascade(plate_crops, models)
+    return recognize_plates_batch(plate_crops, models)
+
+def recognize_plates_cascade(plate_crops, models=None):
+    """
+    Read every crop with the cheap character CNN and run TrOCR only on the crops it is unsure about.
+    """
+    models = models or registry.ensure_loaded()
+    results = [None] * len(plate_crops)
+    hard = []
+    for i, (text, confs) in enumerate(recognize_plates_cnn(plate_crops, models)):
+        if len(confs) and float(confs.min()) >= CASCADE_MIN_CONF and is_plate_format_valid(text):
+            results[i] = text
+        else:
+            hard.append(i)
+    cascade_stats['accepted'] += len(plate_crops) - len(hard)
+    cascade_stats['escalated'] += len(hard)
 
+    if hard and CASCADE_FALLBACK == 'ensemble':
+        for i in hard:
+            results[i] = recognize_plate_trocr_ensemble(plate_crops[i], models=models)
+    elif hard:
+        for i, text in zip(hard, recognize_plates_batch([plate_crops[i] for i in hard], models)):
+            results[i] = text
+    return results
+
+def majority_vote(preds):
     # Majority voting per character position
     if not preds:
         return ""
@@ -59,6 +151,22 @@ def recognize_plate_trocr_ensemble(plate_crop, n=5):
             result += max(set(chars), key=chars.count)
     return result
 
+def recognize_plate_trocr_ensemble(plate_crop, n=5, models=None):
+    """
+    Run TrOCR on n slightly augmented copies of the crop in one batched pass and use majority voting for each character.
+    """
+    if n <= 0:
+        return ""
+    # Random brightness/contrast augmentation for the whole batch at once, shape (n, h, w, 3)
+    alpha = np.random.uniform(0.9, 1.1, size=(n, 1, 1, 1)).astype(np.float32)  # contrast
+    beta = np.random.uniform(-10, 10, size=(n, 1, 1, 1)).astype(np.float32)    # brightness
+    rgb = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2RGB).astype(np.float32)
+    augs = np.clip(alpha * rgb[None] + beta, 0, 255).astype(np.uint8)
+
+    texts = trocr_generate(list(augs), models=models)
+    preds = [clean_plate_string(text) for text in texts]
+    return majority_vote(preds)
+
 def remove_white_border(plate_crop):
     gray = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2GRAY)
     _, thresh = cv2.threshold(gray, 245, 255, cv2.THRESH_BINARY)
@@ -79,36 +187,100 @@ def process_plate_crop(plate_crop):
 
 # New function for backend: process a single image file
 def process_image_file(image_path):
-    img = cv2.imread(image_path)
-    if img is None:
+    try:
+        with stage_metrics.stage('read'), open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError:
         print(f"Could not read {image_path}")
         return None
-    results = det_model(img)
-    # Find the best plate detection
+    return process_image_bytes(data)
+
+def decode_image_bytes(data):
+    # Decode an encoded image (JPG/PNG/...) straight from memory; returns None if it is not a valid image
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return None
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+def process_image_bytes(data, recognize=None):
+    """
+    Recognize the plate in an encoded image held in memory (e.g. an upload stream), without touching the disk.
+    Repeated images are answered from result_cache; `recognize` (default process_image_array) runs on misses.
+    """
+    return result_cache.get_or_compute(data, _decode_or_report, recognize or process_image_array)
+
+def _decode_or_report(data):
+    with stage_metrics.stage('decode'):
+        img = decode_image_bytes(data)
+    if img is None:
+        print("Could not decode image data")
+    return img
+
+def process_image_array(img):
+    """
+    Recognize the plate in a decoded BGR image. Returns the plate text, or None if no plate was found.
+    """
+    return process_image_arrays([img])[0]
+
+def best_plate_crop(img, detections, names, min_conf=0.8):
+    """
+    Crop of the most confident 'plate' detection (rows of x1, y1, x2, y2, conf, cls), or None below min_conf.
+    """
     best_plate = None
     best_conf = 0
-    for (*box, conf, cls) in results.xyxy[0]:
-        if results.names[int(cls)] == 'plate' and conf > best_conf and conf >= 0.8:
+    for (*box, conf, cls) in detections:
+        if names[int(cls)] == 'plate' and conf > best_conf and conf >= min_conf:
             best_plate = box
             best_conf = conf
-    if best_plate is not None:
-        x1, y1, x2, y2 = map(int, best_plate)
-        pad = -10
-        h, w = img.shape[:2]
-        x1_p = min(max(0, x1 - pad), w)
-        y1_p = min(max(0, y1 - pad), h)
-        x2_p = max(min(w, x2 + pad), 0)
-        y2_p = max(min(h, y2 + pad), 0)
-        plate_crop = img[y1_p:y2_p, x1_p:x2_p]
-        plate_crop = remove_white_border(plate_crop)
-        plate_text = recognize_plate_trocr(plate_crop)
-        cleaned_plate_text = clean_plate_string(plate_text)
-        final_plate_text = enforce_second_alpha(cleaned_plate_text)
-        final_plate_text = enforce_plate_length(final_plate_text, length=6)
-        return final_plate_text
-    else:
-        print("No plate detected with sufficient confidence.")
+    if best_plate is None:
         return None
+    x1, y1, x2, y2 = map(int, best_plate)
+    pad = -10
+    h, w = img.shape[:2]
+    x1_p = min(max(0, x1 - pad), w)
+    y1_p = min(max(0, y1 - pad), h)
+    x2_p = max(min(w, x2 + pad), 0)
+    y2_p = max(min(h, y2 + pad), 0)
+    plate_crop = img[y1_p:y2_p, x1_p:x2_p]
+    return remove_white_border(plate_crop)
+
+def process_image_arrays(imgs, models=None):
+    """
+    Recognize plates in a batch of decoded BGR images with one detector pass and one OCR pass.
+    Returns one plate string (or None if no plate was found) per image, in order.
+    """
+    if len(imgs) == 0:
+        return []
+    models = models or registry.ensure_loaded()
+    with stage_metrics.stage('detect', model=True):
+        detections = models.plate_detector.detect(imgs)
+    # Best box, crop and remove_white_border
+    with stage_metrics.stage('crop'):
+        crops = [best_plate_crop(img, det, models.plate_detector.names) for img, det in zip(imgs, detections)]
+    found = [i for i, crop in enumerate(crops) if crop is not None]
+    plates = [None] * len(imgs)
+    texts = recognize_plates([crops[i] for i in found], models)
+    with stage_metrics.stage('postprocess'):
+        for i, plate_text in zip(found, texts):
+            plates[i] = postprocess_plate_text(plate_text)
+    if len(found) < len(imgs):
+        print(f"No plate detected with sufficient confidence in {len(imgs) - len(found)} of {len(imgs)} images.")
+    return plates
+
+def postprocess_plate_text(plate_text):
+    cleaned_plate_text = clean_plate_string(plate_text)
+    final_plate_text = enforce_second_alpha(cleaned_plate_text)
+    final_plate_text = enforce_plate_length(final_plate_text, length=PLATE_LENGTH)
+    return final_plate_text
+
+def is_plate_format_valid(plate_str, length=PLATE_LENGTH):
+    # True when the text needs no correction from enforce_second_alpha / enforce_plate_length
+    cleaned = clean_plate_string(plate_str)
+    return (len(cleaned) == length and enforce_second_alpha(cleaned) == cleaned
+            and enforce_plate_length(cleaned, length=length) == cleaned)
+
+# Digits that OCR commonly reads in place of a similar-looking letter
+DIGIT_TO_ALPHA = {'0': 'D', '1': 'I', '2': 'Z', '5': 'S', '6': 'G', '8': 'B'}
 
 def enforce_second_alpha(plate_str):
     # Remove non-alphanumeric characters
@@ -119,19 +291,19 @@ def enforce_second_alpha(plate_str):
     if not cleaned[1].isalpha():
         # Replace with a placeholder or try to infer from common OCR confusions
         # Example: if it's a digit that looks like a letter, map it
-        digit_to_alpha = {'0': 'D', '1': 'I', '2': 'Z', '5': 'S', '6': 'G', '8': 'B'}
-        corrected = digit_to_alpha.get(cleaned[1], 'A')  # Default to 'A' if unknown
+        corrected = DIGIT_TO_ALPHA.get(cleaned[1], 'A')  # Default to 'A' if unknown
         cleaned = cleaned[0] + corrected + cleaned[2:]
     return cleaned
 
-def enforce_plate_length(plate_str, length=6):
+def enforce_plate_length(plate_str, length=PLATE_LENGTH):
     # Remove non-alphanumeric characters
     cleaned = re.sub(r'[^A-Za-z0-9]', '', plate_str)
     # Only keep the first `length` characters
     return cleaned[:length]
 
 if __name__ == "__main__":
-    results = process_images("car_images", "plates_trocr")
+    # Quick check over the sample images; use batch_recognize.py for large directories and archives
+    image_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "car_images")
     print("\nFinal Results:")
-    for plate_img, plate_text in results.items():
-        print(f"{plate_img}: {plate_text}")
\ No newline at end of file
+    for name in sorted(os.listdir(image_dir)):
+        print(f"{name}: {process_image_file(os.path.join(image_dir, name))}")
\ No newline at end of file
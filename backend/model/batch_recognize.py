@@ -0,0 +1,341 @@
+"""
+Offline plate recognition over directories of car images or zip archives of them (e.g. nightly camera re-scans).
+
+Images are read and decoded by a small thread pool ahead of the model, recognized in batches with one detector and
+one OCR call per batch (the batched form of process_image_file), and written to CSV or JSONL as each batch
+finishes. A batch that fails is retried image by image, so only the image that breaks it is written as an error.
+With --resume, files already in the output are skipped (except those that ended in an error), so an interrupted run
+continues where it stopped.
+
+With --processes N the models are loaded once and N worker processes are forked from the loaded parent, so the
+weights are shared copy-on-write instead of being loaded N times. Each worker is pinned to --threads torch threads
+(cores / N by default; batch-1 style TrOCR work scales better across processes than across intra-op threads) and
+the input files are handed out to the workers batch by batch. If a worker dies (out of memory, a crash in a native
+op), the batches it and its siblings were working on are written as errors and a fresh pool takes the rest.
+CUDA does not survive fork, so --processes is refused when the models run on a GPU; a single process with a larger
+--batch-size keeps the GPU busy instead.
+
+Usage:
+  python batch_recognize.py car_images                          # -> plates.csv
+  python batch_recognize.py /archive/2024-06 cams.zip -o june.jsonl --batch-size 32
+  python batch_recognize.py /archive/2024-06 -o june.jsonl --resume
+  python batch_recognize.py /archive/2024-06 -o june.jsonl --processes 16
+"""
+
+import argparse
+import csv
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import torch
+
+from LPD2 import decode_image_bytes, process_image_arrays
+from model_registry import load_onnx_ocr_model, registry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+FIELDS = ('file', 'plate', 'status')
+ARCHIVE_SEP = '!'  # archive.zip!member/name.jpg
+
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_inputs(paths):
+    """Image files under the given files, directories (recursively) and zip archives, in a stable order."""
+    items = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                items += [os.path.join(root, f) for f in sorted(files) if is_image(f)]
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                items += [f"{path}{ARCHIVE_SEP}{name}" for name in sorted(zf.namelist()) if is_image(name)]
+        elif is_image(path):
+            items.append(path)
+        else:
+            print(f"Skipping {path}: not an image, directory or zip archive", file=sys.stderr)
+    return items
+
+
+_archives_lock = threading.Lock()
+
+
+def read_item(item, archives):
+    if ARCHIVE_SEP in item and not os.path.exists(item):
+        path, member = item.split(ARCHIVE_SEP, 1)
+        with _archives_lock:
+            if path not in archives:
+                archives[path] = zipfile.ZipFile(path)
+        return archives[path].read(member)
+    with open(item, 'rb') as f:
+        return f.read()
+
+
+def load_item(item, archives):
+    # Runs on the prefetch threads (file reads and cv2.imdecode release the GIL)
+    try:
+        return decode_image_bytes(read_item(item, archives))
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def prefetch(items, workers, depth):
+    """Yield (item, decoded image or None) in order, keeping at most `depth` images decoded ahead."""
+    archives = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch') as pool:
+        pending = deque()
+        it = iter(items)
+        for item in it:
+            pending.append((item, pool.submit(load_item, item, archives)))
+            if len(pending) >= depth:
+                break
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(load_item, nxt, archives)))
+    for zf in archives.values():
+        zf.close()
+
+
+def batches(pairs, size):
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def recognize_images(valid):
+    """item -> plate (or the exception) for (item, image) pairs; a failed batch is retried one image at a time."""
+    try:
+        return dict(zip([item for item, _ in valid], process_image_arrays([img for _, img in valid])))
+    except Exception as e:
+        if len(valid) == 1:
+            return {valid[0][0]: e}
+    plates = {}
+    for item, img in valid:
+        try:
+            plates[item] = process_image_arrays([img])[0]
+        except Exception as e:
+            plates[item] = e
+    return plates
+
+
+def recognize_batch(batch):
+    """Result rows for a batch of (item, image) pairs."""
+    valid = [(item, img) for item, img in batch if img is not None]
+    plates = recognize_images(valid) if valid else {}
+    rows = []
+    for item, img in batch:
+        if img is None:
+            rows.append({'file': item, 'plate': '', 'status': 'unreadable'})
+            continue
+        plate = plates[item]
+        if isinstance(plate, Exception):
+            rows.append({'file': item, 'plate': '', 'status': f'error: {plate}'})
+        else:
+            rows.append({'file': item, 'plate': plate or '', 'status': 'ok' if plate else 'no_plate'})
+    return rows
+
+
+def is_done(row):
+    # Rows that ended in an error (e.g. a lost worker) are retried by --resume
+    return bool(row.get('file')) and not (row.get('status') or '').startswith('error')
+
+
+def error_rows(items, error):
+    return [{'file': item, 'plate': '', 'status': f'error: {error}'} for item in items]
+
+
+class ResultWriter:
+    """Appends result rows to a .csv or .jsonl file and knows which files it already holds (for --resume)."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.jsonl = path.endswith('.jsonl')
+        self.done = self._read_done() if resume else set()
+        exists = resume and os.path.isfile(path) and os.path.getsize(path) > 0
+        self._f = open(path, 'a' if resume else 'w', newline='', encoding='utf-8')
+        self._csv = None
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._f, fieldnames=FIELDS)
+            if not exists:
+                self._csv.writeheader()
+
+    def _read_done(self):
+        if not os.path.isfile(self.path):
+            return set()
+        with open(self.path, newline='', encoding='utf-8') as f:
+            if self.path.endswith('.jsonl'):
+                done = set()
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # Truncated last line of an interrupted run
+                    if is_done(row):
+                        done.add(row['file'])
+                return done
+            return {row['file'] for row in csv.DictReader(f) if is_done(row)}
+
+    def write(self, rows):
+        for row in rows:
+            if self.jsonl:
+                self._f.write(json.dumps(row) + '\n')
+            else:
+                self._csv.writerow(row)
+        # Flushed per batch so an interrupted run loses at most one batch
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def _init_worker(threads):
+    # Forked after the models were loaded: only the per-process runtime state is set up here
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    if registry.ocr_backend == 'onnx' and registry.ocr_model is not None:
+        # ONNX Runtime sessions (and their thread pools) do not survive fork
+        registry.ocr_model = load_onnx_ocr_model()
+
+
+def _recognize_shard(items):
+    # Runs in a worker process: read, decode and recognize one batch of files
+    return recognize_batch(list(prefetch(items, workers=2, depth=len(items))))
+
+
+def process_pool_batches(items, batch_size, processes, threads=None):
+    """Yield result rows batch by batch from `processes` forked workers (completion order)."""
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("--processes needs the 'fork' start method (Linux/macOS)")
+    if registry.device.type == 'cuda':
+        raise RuntimeError("--processes forks after the models are loaded, which CUDA does not support; on a GPU host "
+                           "run a single process (with a larger --batch-size) or hide the GPU with "
+                           "CUDA_VISIBLE_DEVICES=")
+    threads = threads or max(1, (os.cpu_count() or 1) // processes)
+    registry.load()
+    # Keep the garbage collector from touching (and so copying) the parent's objects in every worker
+    gc.freeze()
+    shards = deque(items[i:i + batch_size] for i in range(0, len(items), batch_size))
+    try:
+        while shards:
+            yield from _run_pool(shards, processes, threads)
+    finally:
+        gc.unfreeze()
+
+
+def _run_pool(shards, processes, threads):
+    # Feeds shards to one pool, keeping a few per worker in flight. A dead worker breaks the whole pool: the shards in
+    # flight are yielded as error rows (so --resume retries them) and the caller starts a new pool for the rest.
+    pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork'),
+                               initializer=_init_worker, initargs=(threads,))
+    pending = {}
+    try:
+        while shards or pending:
+            while shards and len(pending) < processes * 2:
+                shard = shards.popleft()
+                pending[pool.submit(_recognize_shard, shard)] = shard
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            lost = []
+            for future in done:
+                shard = pending.pop(future)
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    lost.append(shard)
+                except Exception as e:
+                    yield error_rows(shard, e)
+            if lost:
+                lost += pending.values()
+                pending.clear()
+                print(f"A worker process died; {sum(map(len, lost))} images in flight are recorded as errors "
+                      f"(--resume retries them)", file=sys.stderr)
+                for shard in lost:
+                    yield error_rows(shard, 'worker process died')
+                return
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run(items, writer, batch_size=16, workers=4, processes=1, threads=None, progress_every=10.0):
+    """Recognize items and write their rows; returns a summary dict."""
+    counts = {'ok': 0, 'no_plate': 0, 'unreadable': 0, 'error': 0}
+    t0 = last = time.perf_counter()
+    processed = 0
+    if processes > 1:
+        row_batches = process_pool_batches(items, batch_size, processes, threads)
+    else:
+        if threads:
+            torch.set_num_threads(threads)
+        row_batches = (recognize_batch(batch)
+                       for batch in batches(prefetch(items, workers, depth=batch_size * 2), batch_size))
+    for rows in row_batches:
+        writer.write(rows)
+        for row in rows:
+            counts[row['status'].split(':')[0]] += 1
+        processed += len(rows)
+        now = time.perf_counter()
+        if now - last >= progress_every:
+            print(f"{processed}/{len(items)} images, {processed / (now - t0):.1f} images/s")
+            last = now
+    elapsed = time.perf_counter() - t0
+    return dict(counts, images=processed, seconds=elapsed, images_per_second=processed / elapsed if elapsed else 0.0)
+
+
+def print_summary(summary, skipped=0):
+    print(f"\n{summary['images']} images in {summary['seconds']:.1f}s ({summary['images_per_second']:.1f} images/s)")
+    print(f"  plates read: {summary['ok']}, no plate: {summary['no_plate']}, unreadable: {summary['unreadable']}, "
+          f"errors: {summary['error']}" + (f", skipped (already done): {skipped}" if skipped else ""))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='image files, directories or zip archives')
+    parser.add_argument('-o', '--output', default='plates.csv', help='results file (.csv or .jsonl)')
+    parser.add_argument('--batch-size', type=int, default=16, help='images per detector/OCR batch')
+    parser.add_argument('--workers', type=int, default=4, help='threads reading and decoding images ahead')
+    parser.add_argument('--resume', action='store_true', help='append to the output and skip files already in it')
+    parser.add_argument('--limit', type=int, default=None, help='only process the first N images')
+    parser.add_argument('--processes', type=int, default=1, help='forked worker processes sharing the loaded models')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='torch threads per process (default: cores / processes with --processes)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    items = list_inputs(args.inputs)
+    writer = ResultWriter(args.output, resume=args.resume)
+    todo = [item for item in items if item not in writer.done]
+    skipped = len(items) - len(todo)
+    if args.limit:
+        todo = todo[:args.limit]
+    try:
+        summary = run(todo, writer, batch_size=args.batch_size, workers=args.workers, processes=args.processes,
+                      threads=args.threads)
+    finally:
+        writer.close()
+    print_summary(summary, skipped=skipped)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
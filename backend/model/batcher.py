@@ -0,0 +1,112 @@
+"""
+Dynamic micro-batching for concurrent recognition requests.
+
+Callers block in submit() while a single scheduler thread groups the items that arrive within `window_ms` of each
+other (up to `max_batch`) and runs the batch function once for the whole group, so the detector and OCR run at the
+batch size the traffic allows instead of once per request.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches for batch_fn(items) -> results (one result per item, in order).
+    If batch_fn raises for a batch, the batch is re-run one item at a time so a bad item only fails its own caller.
+    """
+
+    def __init__(self, batch_fn, max_batch=8, window_ms=10.0, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, max_batch)
+        self.window = window_ms / 1e3
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'batches': 0, 'items': 0, 'max_batch_seen': 0, 'errors': 0, 'retried_batches': 0,
+                       'item_errors': 0, 'run_seconds': 0.0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit_async(self, item):
+        """Queue an item; returns a Future for its result."""
+        self.start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def submit(self, item, timeout=None):
+        """Queue an item and wait for its result (re-raises the batch function's exception for that item)."""
+        return self.submit_async(item).result(timeout)
+
+    def _collect(self):
+        # Block for the first item, then keep the batch open for the window or until it is full
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, future in batch]
+            t0 = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                with self._lock:
+                    self._stats['errors'] += 1
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_one_by_one(batch)
+                continue
+            finally:
+                with self._lock:
+                    self._stats['batches'] += 1
+                    self._stats['items'] += len(items)
+                    self._stats['max_batch_seen'] = max(self._stats['max_batch_seen'], len(items))
+                    self._stats['run_seconds'] += time.perf_counter() - t0
+            for (item, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_one_by_one(self, batch):
+        # A failed batch is retried item by item so only the item that broke it gets the exception
+        with self._lock:
+            self._stats['retried_batches'] += 1
+        for item, future in batch:
+            try:
+                results = self.batch_fn([item])
+                if len(results) != 1:
+                    raise RuntimeError(f"Batch function returned {len(results)} results for 1 item")
+            except Exception as e:
+                with self._lock:
+                    self._stats['item_errors'] += 1
+                future.set_exception(e)
+            else:
+                future.set_result(results[0])
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches']
+        stats['pending'] = self._queue.qsize()
+        stats['max_batch'] = self.max_batch
+        stats['window_ms'] = self.window * 1e3
+        stats['avg_batch_size'] = round(stats['items'] / batches, 2) if batches else 0.0
+        stats['avg_batch_ms'] = round(stats.pop('run_seconds') / batches * 1e3, 1) if batches else 0.0
+        return stats
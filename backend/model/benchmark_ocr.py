@@ -0,0 +1,110 @@
+"""
+Accuracy/latency comparison of TrOCR variants over the labelled plate crops in backend/model/plates.
+
+Each file is named after its plate (e.g. 1E-5084.jpg), which is used as the ground truth.
+
+Usage:
+  python benchmark_ocr.py                     # fp32 vs dynamic INT8
+  python benchmark_ocr.py --onnx              # also include the ONNX Runtime backend
+  python benchmark_ocr.py --cnn               # also include the alphanumeric character CNN
+  python benchmark_ocr.py --decoding          # checkpoint decoding vs the plate decoding profile (fp32)
+  python benchmark_ocr.py --plates other_dir --limit 20
+"""
+
+import argparse
+import os
+import time
+from glob import glob
+
+import cv2
+import numpy as np
+
+from LPD2 import clean_plate_string, postprocess_plate_text, recognize_plates, remove_white_border
+from model_registry import MODEL_DIR, ModelRegistry
+
+
+def load_plates(plates_dir, limit=None):
+    plates = []
+    for path in sorted(glob(os.path.join(plates_dir, '*.jpg'))):
+        img = cv2.imread(path)
+        if img is None:
+            continue  # Skip unreadable files
+        truth = clean_plate_string(os.path.splitext(os.path.basename(path))[0])
+        plates.append((truth, remove_white_border(img)))
+    return plates[:limit] if limit else plates
+
+
+def run_variant(name, models, plates, warmup=2):
+    models.load_ocr()
+    for truth, crop in plates[:warmup]:
+        recognize_plates([crop], models=models)
+
+    latencies, correct, char_correct, char_total = [], 0, 0, 0
+    for truth, crop in plates:
+        t0 = time.perf_counter()
+        text = recognize_plates([crop], models=models)[0]
+        latencies.append(time.perf_counter() - t0)
+        pred = postprocess_plate_text(text)
+        correct += pred == truth
+        char_correct += sum(a == b for a, b in zip(pred, truth))
+        char_total += len(truth)
+
+    latencies = np.array(latencies) * 1e3
+    return {
+        'variant': name,
+        'plates': len(plates),
+        'plate_accuracy': correct / max(len(plates), 1),
+        'char_accuracy': char_correct / max(char_total, 1),
+        'mean_ms': latencies.mean() if len(latencies) else 0.0,
+        'p95_ms': np.percentile(latencies, 95) if len(latencies) else 0.0,
+    }
+
+
+def print_report(rows):
+    print(f"\n{'variant':<14}{'plates':>8}{'plate acc':>12}{'char acc':>11}{'mean ms':>10}{'p95 ms':>10}")
+    for r in rows:
+        print(f"{r['variant']:<14}{r['plates']:>8}{r['plate_accuracy']:>12.1%}{r['char_accuracy']:>11.1%}"
+              f"{r['mean_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+    print()
+    base = rows[0]
+    for r in rows[1:]:
+        if r['mean_ms']:
+            print(f"{r['variant']} vs {base['variant']}: {base['mean_ms'] / r['mean_ms']:.2f}x speed-up, "
+                  f"{base['mean_ms'] - r['mean_ms']:.1f} ms saved per plate")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plates', default=str(MODEL_DIR / 'plates'), help='directory of labelled plate crops')
+    parser.add_argument('--limit', type=int, default=None, help='only use the first N plates')
+    parser.add_argument('--onnx', action='store_true', help='also benchmark the ONNX Runtime backend')
+    parser.add_argument('--cnn', action='store_true', help='also benchmark the character CNN engine')
+    parser.add_argument('--decoding', action='store_true', help='compare TrOCR decoding profiles instead of model variants')
+    args = parser.parse_args()
+
+    plates = load_plates(args.plates, args.limit)
+    if not plates:
+        print(f"No plate images found in {args.plates}")
+        return
+    if args.decoding:
+        rows = [
+            run_variant('default', ModelRegistry(quantize_ocr=False, ocr_decoding='default'), plates),
+            run_variant('plate', ModelRegistry(quantize_ocr=False, ocr_decoding='plate'), plates),
+            run_variant('plate+vocab', ModelRegistry(quantize_ocr=False, ocr_decoding='plate', ocr_constrain_vocab=True),
+                        plates),
+        ]
+        print_report(rows)
+        return
+    rows = [
+        run_variant('fp32', ModelRegistry(quantize_ocr=False), plates),
+        run_variant('int8', ModelRegistry(quantize_ocr=True), plates),
+    ]
+    if args.onnx:
+        rows.append(run_variant('onnx', ModelRegistry(quantize_ocr=False, ocr_backend='onnx'), plates))
+    if args.cnn:
+        rows.append(run_variant('cnn', ModelRegistry(ocr_engine='cnn'), plates))
+    print_report(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Alphanumeric CNN plate reader.
+
+The plate crop is segmented into single characters with OpenCV and every character of every crop is classified in
+one batched forward pass of a small YOLOv5 ClassificationModel trained on backend/model/alphanumeric:
+
+  cd backend/model/yolov5
+  python classify/train.py --model yolov5n-cls.pt --data ../alphanumeric --img 64 --epochs 50
+  cp runs/train-cls/exp/weights/best.pt ../char_classifier.pt
+"""
+
+import cv2
+import numpy as np
+import torch
+
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)  # RGB mean
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)  # RGB standard deviation
+
+
+def segment_characters(plate_crop, min_height=0.35, max_height=0.95):
+    """
+    Split the main line of a BGR plate crop into character images, left to right.
+
+    Characters are returned as white-on-black grayscale images, the same polarity as the training set.
+    """
+    h, w = plate_crop.shape[:2]
+    # Remove upper code line, as for TrOCR
+    main = plate_crop[int(h*0.33):, :]
+    gray = cv2.cvtColor(main, cv2.COLOR_BGR2GRAY) if main.ndim == 3 else main
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Characters are the minority class; make them white whatever the plate colours are
+    if cv2.countNonZero(thresh) > thresh.size / 2:
+        thresh = 255 - thresh
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+
+    mh = thresh.shape[0]
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = []
+    for c in contours:
+        x, y, cw, ch = cv2.boundingRect(c)
+        # Drop the hyphen, screws and border remnants by height and aspect ratio
+        if min_height * mh <= ch <= max_height * mh and 0.1 <= cw / ch <= 1.0:
+            boxes.append((x, y, cw, ch))
+    boxes.sort(key=lambda b: b[0])
+    return [thresh[y:y+ch, x:x+cw] for x, y, cw, ch in boxes]
+
+
+def to_square(char_img, size, margin=0.15):
+    # Pad to a centred square with a black margin, then resize (training images are square)
+    h, w = char_img.shape[:2]
+    side = int(max(h, w) * (1 + 2 * margin))
+    canvas = np.zeros((side, side), dtype=np.uint8)
+    y0, x0 = (side - h) // 2, (side - w) // 2
+    canvas[y0:y0+h, x0:x0+w] = char_img
+    return cv2.resize(canvas, (size, size), interpolation=cv2.INTER_AREA)
+
+
+class CharCNNRecognizer:
+    """Segments plate crops into characters and classifies them all in one forward pass."""
+
+    def __init__(self, weights, device=None, imgsz=64):
+        from models.common import DetectMultiBackend
+
+        self.device = device or torch.device('cpu')
+        self.imgsz = imgsz
+        self.model = DetectMultiBackend(str(weights), device=self.device, fuse=True)
+        self.model.eval()
+        # Class folders are named class_0 ... class_Z
+        names = self.model.names
+        self.names = [str(names[i]).split('_')[-1] for i in range(len(names))]
+
+    def _preprocess(self, char_imgs):
+        # (N, size, size) uint8 -> normalized (N, 3, size, size) float tensor
+        x = np.stack([to_square(c, self.imgsz) for c in char_imgs]).astype(np.float32) / 255.0
+        x = (x[..., None] - IMAGENET_MEAN) / IMAGENET_STD
+        x = torch.from_numpy(np.ascontiguousarray(x.transpose(0, 3, 1, 2))).to(self.device)
+        return x.half() if self.model.fp16 else x
+
+    @torch.no_grad()
+    def classify(self, char_imgs):
+        """Classify character images; returns (characters, confidences)."""
+        if not char_imgs:
+            return [], np.zeros(0, dtype=np.float32)
+        logits = self.model(self._preprocess(char_imgs))
+        probs = torch.softmax(logits.float(), dim=1)
+        conf, idx = probs.max(1)
+        return [self.names[i] for i in idx.tolist()], conf.cpu().numpy()
+
+    def recognize_batch(self, plate_crops):
+        """Recognize plate crops; returns a (text, per-character confidences) pair per crop."""
+        segmented = [segment_characters(crop) for crop in plate_crops]
+        chars, confs = self.classify([c for crop_chars in segmented for c in crop_chars])
+        results, start = [], 0
+        for crop_chars in segmented:
+            end = start + len(crop_chars)
+            results.append((''.join(chars[start:end]), confs[start:end]))
+            start = end
+        return results
+
+    def warmup(self):
+        self.classify([np.zeros((self.imgsz, self.imgsz), dtype=np.uint8)])
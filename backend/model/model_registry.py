@@ -0,0 +1,295 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import torch
+from PIL import Image
+from transformers import AutoConfig, TrOCRProcessor, VisionEncoderDecoderModel
+
+from plate_detector import PlateDetector
+
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+MODEL_DIR = Path(__file__).resolve().parent
+YOLOV5_DIR = MODEL_DIR / 'yolov5'
+
+# Vendored YOLOv5 code is imported directly so that loading never goes through torch.hub / GitHub
+if str(YOLOV5_DIR) not in sys.path:
+    sys.path.append(str(YOLOV5_DIR))
+
+# A local directory can be given for air-gapped hosts (combine with HF_HUB_OFFLINE=1)
+TROCR_CHECKPOINT = os.environ.get('LPD_TROCR_CHECKPOINT', 'microsoft/trocr-base-printed')
+WEIGHTS_DIR = Path(os.environ.get('LPD_WEIGHTS_DIR', MODEL_DIR))
+DETECTOR_WEIGHTS = os.environ.get('LPD_DETECTOR_WEIGHTS', 'plate_detection.pt')
+
+# Opt-in dynamic INT8 TrOCR for CPU-only hosts; the quantized state dict is cached on disk
+QUANTIZE_OCR = os.environ.get('LPD_TROCR_QUANTIZE', '0') == '1'
+QUANTIZED_OCR_CACHE = Path(os.environ.get('LPD_TROCR_INT8_CACHE', WEIGHTS_DIR / 'trocr_int8.pt'))
+
+# TrOCR execution backend: 'torch' (eager generate) or 'onnx' (ONNX Runtime with KV-cache greedy decoding)
+OCR_BACKEND = os.environ.get('LPD_OCR_BACKEND', 'torch').lower()
+OCR_ONNX_DIR = Path(os.environ.get('LPD_TROCR_ONNX_DIR', WEIGHTS_DIR / 'trocr_onnx'))
+
+# OCR engine per deployment: 'trocr' (seq2seq transformer), 'cnn' (segmented characters + small classifier)
+# or 'cascade' (cnn first, TrOCR only for low-confidence crops)
+OCR_ENGINE = os.environ.get('LPD_OCR_ENGINE', 'trocr').lower()
+OCR_ENGINES = ('trocr', 'cnn', 'cascade')
+# TrOCR decoding: 'plate' (greedy, plate-sized token budget) or 'default' (checkpoint generation config);
+# LPD_OCR_CONSTRAIN_VOCAB=1 additionally limits decoding to A-Z / 0-9 tokens
+OCR_DECODING = os.environ.get('LPD_OCR_DECODING', 'plate').lower()
+OCR_CONSTRAIN_VOCAB = os.environ.get('LPD_OCR_CONSTRAIN_VOCAB', '0') == '1'
+
+# After a failed load, the next attempt waits this long, doubling per failure up to LOAD_RETRY_MAX_SECONDS
+LOAD_RETRY_SECONDS = float(os.environ.get('LPD_LOAD_RETRY_SECONDS', '30'))
+LOAD_RETRY_MAX_SECONDS = 600.0
+
+CHAR_WEIGHTS = os.environ.get('LPD_CHAR_WEIGHTS', 'char_classifier.pt')
+CHAR_IMGSZ = int(os.environ.get('LPD_CHAR_IMGSZ', '64'))
+
+# Fused, eval-mode detectors keyed by (weights path, device)
+_detector_cache = {}
+
+
+def resolve_weights(name, weights_dir=None):
+    """Resolve a weights file against the configured local weights directory. Never downloads."""
+    path = Path(name)
+    if not path.is_absolute():
+        path = Path(weights_dir or WEIGHTS_DIR) / path
+    if not path.is_file():
+        raise FileNotFoundError(f"Weights not found: {path} (set LPD_WEIGHTS_DIR to the directory holding them)")
+    return path
+
+
+def load_detector(weights=DETECTOR_WEIGHTS, device=None, weights_dir=None):
+    """
+    Load the plate detector from local weights with the vendored DetectMultiBackend.
+
+    The fused, eval-mode model is cached, so repeated calls in the same process are free.
+    """
+    from models.common import AutoShape, DetectMultiBackend
+
+    path = resolve_weights(weights, weights_dir)
+    device = device or torch.device('cpu')
+    key = (str(path), str(device))
+    if key not in _detector_cache:
+        backend = DetectMultiBackend(str(path), device=device, fuse=True)
+        _detector_cache[key] = AutoShape(backend, verbose=False).eval()
+    return _detector_cache[key]
+
+
+def quantize_ocr_model(model):
+    """Apply dynamic INT8 quantization to the Linear layers of the TrOCR encoder and decoder (CPU only)."""
+    return torch.quantization.quantize_dynamic(model.to('cpu').eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_onnx_ocr_model(onnx_dir=OCR_ONNX_DIR):
+    """Load the ONNX Runtime TrOCR, exporting it from the PyTorch checkpoint on first use."""
+    from trocr_onnx import OnnxTrOCR, export_trocr_onnx, is_exported
+
+    if not is_exported(onnx_dir):
+        print(f"Exporting TrOCR to ONNX in {onnx_dir}...")
+        export_trocr_onnx(load_ocr_model(), onnx_dir)
+    return OnnxTrOCR(onnx_dir)
+
+
+def load_char_recognizer(weights=CHAR_WEIGHTS, device=None, imgsz=CHAR_IMGSZ):
+    from char_recognizer import CharCNNRecognizer
+
+    return CharCNNRecognizer(resolve_weights(weights), device=device, imgsz=imgsz)
+
+
+def checkpoint_fingerprint(checkpoint=TROCR_CHECKPOINT):
+    """
+    Identifies the weights behind a checkpoint without reading them: the id or path, plus the size and mtime of its
+    files when it is a local directory or file (a hub id is taken as is).
+    """
+    path = Path(checkpoint)
+    if path.is_dir():
+        files = sorted(p for p in path.rglob('*') if p.is_file())
+    elif path.is_file():
+        files = [path]
+    else:
+        return str(checkpoint)
+    digest = hashlib.sha1()
+    for p in files:
+        st = p.stat()
+        digest.update(f"{p.relative_to(path) if path.is_dir() else p.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return f"{checkpoint}@{digest.hexdigest()}"
+
+
+def load_ocr_model(quantize=False, device=None, cache_path=QUANTIZED_OCR_CACHE):
+    """
+    Load the TrOCR VisionEncoderDecoderModel in eval mode.
+
+    With quantize=True the model runs on CPU with INT8 Linear layers. If a cached quantized state dict built from the
+    same checkpoint exists the fp32 checkpoint weights are never read; otherwise the model is quantized and the
+    result is written to the cache, together with the checkpoint fingerprint it was built from.
+    """
+    if not quantize:
+        return VisionEncoderDecoderModel.from_pretrained(TROCR_CHECKPOINT).to(device or 'cpu').eval()
+
+    cache_path = Path(cache_path) if cache_path else None
+    source = checkpoint_fingerprint()
+    if cache_path is not None and cache_path.is_file():
+        cached = torch.load(cache_path, map_location='cpu')
+        if cached.get('source') == source:
+            model = quantize_ocr_model(VisionEncoderDecoderModel(AutoConfig.from_pretrained(TROCR_CHECKPOINT)))
+            model.load_state_dict(cached['state_dict'])
+            return model.eval()
+        print(f"Quantized TrOCR cache {cache_path} was not built from {TROCR_CHECKPOINT} as it is now; rebuilding it")
+
+    model = quantize_ocr_model(VisionEncoderDecoderModel.from_pretrained(TROCR_CHECKPOINT))
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            torch.save({'source': source, 'state_dict': model.state_dict()}, cache_path)
+        except OSError as e:
+            print(f"Could not cache quantized TrOCR model at {cache_path}: {e}")
+    return model
+
+
+class ModelRegistry:
+    """
+    Holds the plate detector and the TrOCR model for the lifetime of a worker.
+
+    Models are loaded once, warmed up with dummy inputs and then shared by every request. A failed load is retried
+    with exponential backoff (from retry_seconds), not by every request that finds the models missing.
+    """
+
+    def __init__(self, quantize_ocr=QUANTIZE_OCR, ocr_backend=OCR_BACKEND, ocr_engine=OCR_ENGINE,
+                 ocr_decoding=OCR_DECODING, ocr_constrain_vocab=OCR_CONSTRAIN_VOCAB, retry_seconds=LOAD_RETRY_SECONDS):
+        if ocr_backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unknown OCR backend '{ocr_backend}', expected 'torch' or 'onnx'")
+        if ocr_engine not in OCR_ENGINES:
+            raise ValueError(f"Unknown OCR engine '{ocr_engine}', expected one of {OCR_ENGINES}")
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.ocr_engine = ocr_engine
+        self.ocr_decoding = ocr_decoding
+        self.ocr_constrain_vocab = ocr_constrain_vocab
+        self.ocr_backend = ocr_backend
+        self.quantize_ocr = quantize_ocr and ocr_backend == 'torch'
+        # Quantized kernels are CPU only and ONNX Runtime takes NumPy inputs
+        self.ocr_device = torch.device('cpu') if self.quantize_ocr or ocr_backend == 'onnx' else self.device
+        self.det_model = None
+        self.plate_detector = None
+        self.processor = None
+        self.ocr_model = None
+        self.char_model = None
+        self.ready = False
+        self.loading = False
+        self.error = None
+        self.load_seconds = None
+        self.retry_seconds = retry_seconds
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def load(self):
+        """Load and warm up all models. Safe to call more than once; raises at once while a retry is backing off."""
+        with self._lock:
+            if self.ready:
+                return self
+            if self.error and not self.retry_due():
+                raise RuntimeError(f"Model loading failed: {self.error}")
+            t0 = time.time()
+            self.loading = True
+            try:
+                self.det_model = load_detector(device=self.device)
+                # LPD2 only keeps the most confident plate per image
+                self.plate_detector = PlateDetector(self.det_model.model, topk=1)
+                self.load_ocr()
+                self.warmup()
+            except Exception as e:
+                self.error = str(e)
+                self._failures += 1
+                delay = min(self.retry_seconds * 2 ** (self._failures - 1), LOAD_RETRY_MAX_SECONDS)
+                self._retry_at = time.monotonic() + delay
+                raise
+            finally:
+                self.loading = False
+            self.error = None
+            self._failures = 0
+            self.load_seconds = time.time() - t0
+            self.ready = True
+        return self
+
+    def uses_trocr(self):
+        return self.ocr_engine in ('trocr', 'cascade')
+
+    def uses_char_cnn(self):
+        return self.ocr_engine in ('cnn', 'cascade')
+
+    def load_ocr(self):
+        """Load only the OCR engine(s) of this deployment (used by tools that never run the detector)."""
+        if self.uses_trocr() and self.ocr_model is None:
+            self.processor = TrOCRProcessor.from_pretrained(TROCR_CHECKPOINT)
+            if self.ocr_backend == 'onnx':
+                self.ocr_model = load_onnx_ocr_model()
+            else:
+                self.ocr_model = load_ocr_model(quantize=self.quantize_ocr, device=self.ocr_device)
+        if self.uses_char_cnn() and self.char_model is None:
+            self.char_model = load_char_recognizer(device=self.device)
+        return self
+
+    def warmup(self):
+        # Run each model once so lazy initialisation (kernels, allocators) happens before real traffic
+        self.plate_detector.warmup()
+        self.warmup_ocr()
+
+    def warmup_ocr(self):
+        if self.ocr_model is not None:
+            dummy = Image.new('RGB', (384, 128), color='white')
+            pixel_values = self.processor(images=dummy, return_tensors="pt").pixel_values.to(self.ocr_device)
+            self.ocr_model.generate(pixel_values, max_new_tokens=2)
+        if self.char_model is not None:
+            self.char_model.warmup()
+
+    def ensure_loaded(self):
+        return self if self.ready else self.load()
+
+    def retry_due(self):
+        return time.monotonic() >= self._retry_at
+
+    def start(self):
+        """
+        Load models in a background thread so the server can report readiness while loading. After a failure this
+        only starts another attempt once the backoff has passed, so it is cheap to call on every request.
+        """
+        with self._lock:
+            if self.ready or (self._thread is not None and self._thread.is_alive()):
+                return
+            if self.error and not self.retry_due():
+                return
+            self._thread = threading.Thread(target=self._load_quietly, name='model-loader', daemon=True)
+            self._thread.start()
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Model loading error: {e}")
+
+    def status(self):
+        if self.ready:
+            state = 'ready'
+        elif self.error and not self.loading:
+            state = 'failed'
+        else:
+            state = 'loading'
+        info = {'status': state, 'device': str(self.device), 'ocr_engine': self.ocr_engine,
+                'ocr_backend': self.ocr_backend,
+                'ocr_quantized': self.quantize_ocr}
+        if self.load_seconds is not None:
+            info['load_seconds'] = round(self.load_seconds, 2)
+        if self.error:
+            info['error'] = self.error
+            info['failures'] = self._failures
+            info['retry_in_seconds'] = round(max(0.0, self._retry_at - time.monotonic()), 1)
+        return info
+
+
+registry = ModelRegistry()
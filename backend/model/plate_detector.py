@@ -0,0 +1,94 @@
+"""
+Lean plate detection on top of the vendored DetectMultiBackend.
+
+AutoShape.forward preprocesses image by image in Python, copies every input image and builds a Detections object
+of which LPD2 only ever read results.xyxy. PlateDetector letterboxes straight into reused buffers, runs the backend
+once per batch, applies NMS and returns plain NumPy boxes. Preprocessing, thresholds and box scaling match
+AutoShape, so the boxes are the same.
+"""
+
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+LETTERBOX_COLOR = 114
+MAX_CACHED_SHAPES = 8
+
+
+class PlateDetector:
+    """
+    Batched detector returning an (n, 6) float32 array of x1, y1, x2, y2, conf, cls per image.
+
+    topk limits the boxes kept per image for single-class models; topk=1 returns just the best box without NMS.
+    """
+
+    def __init__(self, backend, size=640, conf=0.25, iou=0.45, max_det=1000, topk=None):
+        self.model = backend.eval()
+        self.size = size
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.topk = topk
+        self.names = backend.names
+        self.stride = int(backend.stride)
+        self.device = backend.device
+        self.dtype = torch.float16 if backend.fp16 else torch.float32
+        self._buffers = {}  # (n, h, w) -> (uint8 HWC host batch, BCHW input tensor on the model device)
+        self._lock = threading.Lock()
+
+    def _inference_shape(self, shapes):
+        # Same rule as AutoShape: scale the longest side to `size`, then round the batch maximum up to the stride
+        from utils.general import make_divisible
+
+        scaled = [[int(d * (self.size / max(s))) for d in s] for s in shapes]
+        return tuple(make_divisible(d, self.stride) for d in np.array(scaled).max(0))
+
+    def _buffers_for(self, n, h, w):
+        key = (n, h, w)
+        if key not in self._buffers:
+            if len(self._buffers) >= MAX_CACHED_SHAPES:
+                self._buffers.clear()
+            host = np.empty((n, h, w, 3), dtype=np.uint8)
+            tensor = torch.empty((n, 3, h, w), dtype=self.dtype, device=self.device)
+            self._buffers[key] = (host, tensor)
+        return self._buffers[key]
+
+    def _letterbox_into(self, out, im):
+        # Equivalent to utils.augmentations.letterbox(im, out.shape[:2], auto=False), written into `out`
+        h0, w0 = im.shape[:2]
+        h1, w1 = out.shape[:2]
+        r = min(h1 / h0, w1 / w0)
+        nw, nh = int(round(w0 * r)), int(round(h0 * r))
+        top, left = int(round((h1 - nh) / 2 - 0.1)), int(round((w1 - nw) / 2 - 0.1))
+        out.fill(LETTERBOX_COLOR)
+        out[top:top + nh, left:left + nw] = cv2.resize(im, (nw, nh), interpolation=cv2.INTER_LINEAR) \
+            if (w0, h0) != (nw, nh) else im
+
+    @torch.no_grad()
+    def detect(self, imgs):
+        """Detect plates in a list of HxWx3 uint8 images (fed in the same channel order AutoShape received)."""
+        from utils.general import non_max_suppression, scale_boxes
+
+        if len(imgs) == 0:
+            return []
+        imgs = [cv2.cvtColor(im, cv2.COLOR_GRAY2BGR) if im.ndim == 2 else im[..., :3] for im in imgs]
+        shapes = [im.shape[:2] for im in imgs]
+        h, w = self._inference_shape(shapes)
+        with self._lock:
+            host, x = self._buffers_for(len(imgs), h, w)
+            for i, im in enumerate(imgs):
+                self._letterbox_into(host[i], im)
+            x.copy_(torch.from_numpy(host).permute(0, 3, 1, 2))
+            x.div_(255)
+            pred = self.model(x)
+            pred = non_max_suppression(pred, self.conf, self.iou, max_det=self.max_det, topk=self.topk)
+        boxes = []
+        for det, shape in zip(pred, shapes):
+            scale_boxes((h, w), det[:, :4], shape)
+            boxes.append(det.float().cpu().numpy())
+        return boxes
+
+    def warmup(self):
+        self.detect([np.zeros((self.size, self.size, 3), dtype=np.uint8)])
@@ -0,0 +1,132 @@
+"""
+Short-lived cache of plate recognition results for repeated gate images.
+
+Gate cameras and retrying clients resend the same frame. Results are keyed by the SHA-1 of the encoded bytes, so
+byte-identical resubmissions never decode the image. Matching on a difference hash of the decoded image (re-encoded
+or slightly different frames) is opt-in: the whole-frame hash is dominated by the fixed gate background rather than
+the small plate, so a different car at the same gate can match and be served the wrong plate.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def dhash(img, size=16):
+    """Difference hash (size*size bits) of a BGR or grayscale image: signs of horizontal gradients on a thumbnail."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with a TTL. size=0 disables it. Exact byte matches only, unless perceptual=True, which also
+    accepts images with the same difference hash or, with max_hamming > 0, one within that many bits of a cached
+    one (a linear scan, so keep the cache small).
+    """
+
+    def __init__(self, size=256, ttl=10.0, perceptual=False, max_hamming=0):
+        self.size = size
+        self.ttl = ttl
+        self.perceptual = perceptual
+        self.max_hamming = max_hamming
+        self._entries = OrderedDict()  # sha1 -> (expires_at, dhash or None, value)
+        self._by_hash = {}  # dhash -> sha1 of the newest entry with that hash
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'perceptual_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def _live(self, sha, now):
+        entry = self._entries.get(sha)
+        if entry is None:
+            return None
+        if entry[0] < now:
+            self._drop(sha)
+            self._stats['expired'] += 1
+            return None
+        self._entries.move_to_end(sha)
+        return entry
+
+    def _drop(self, sha):
+        _, h, _ = self._entries.pop(sha)
+        if h is not None and self._by_hash.get(h) == sha:
+            del self._by_hash[h]
+
+    def _find_similar(self, h, now):
+        sha = self._by_hash.get(h)
+        entry = self._live(sha, now) if sha else None
+        if entry is not None or self.max_hamming <= 0:
+            return entry
+        for sha, (expires_at, other, value) in list(self._entries.items()):
+            if expires_at >= now and other is not None and hamming(h, other) <= self.max_hamming:
+                return self._live(sha, now)
+        return None
+
+    def _put(self, sha, h, value, now):
+        if sha in self._entries:
+            self._drop(sha)
+        self._entries[sha] = (now + self.ttl, h, value)
+        if h is not None:
+            self._by_hash[h] = sha
+        while len(self._entries) > self.size:
+            self._drop(next(iter(self._entries)))
+            self._stats['evictions'] += 1
+
+    def get_or_compute(self, data, decode, compute):
+        """
+        Cached result for encoded image bytes, or compute(decode(data)) stored under its SHA-1 (and dhash).
+        Returns None without caching when the bytes do not decode.
+        """
+        if self.size <= 0:
+            img = decode(data)
+            return None if img is None else compute(img)
+
+        sha = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            entry = self._live(sha, time.monotonic())
+            if entry is not None:
+                self._stats['exact_hits'] += 1
+                return entry[2]
+
+        img = decode(data)
+        if img is None:
+            return None
+        h = dhash(img) if self.perceptual else None
+        with self._lock:
+            now = time.monotonic()
+            entry = self._find_similar(h, now) if h is not None else None
+            if entry is not None:
+                self._stats['perceptual_hits'] += 1
+                self._put(sha, h, entry[2], now)
+                return entry[2]
+            self._stats['misses'] += 1
+
+        value = compute(img)
+        with self._lock:
+            self._put(sha, h, value, time.monotonic())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_hash.clear()
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['exact_hits'] + stats['perceptual_hits'] + stats['misses']
+        stats['size'] = self.size
+        stats['ttl_seconds'] = self.ttl
+        stats['perceptual'] = self.perceptual
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,103 @@
+"""
+Per-stage latency histograms for the plate pipeline and the upload handlers.
+
+Stages are timed with the vendored YOLOv5 Profile context manager (which synchronizes CUDA for model stages so GPU
+time is attributed to the right stage) and aggregated into fixed-bucket histograms, exported in the Prometheus text
+format by /metrics. Stages that run in the request's own thread are also collected per request, for the optional
+Server-Timing debug header. Model stages are timed per call, i.e. per batch when requests are batched.
+"""
+
+import contextvars
+import threading
+
+from model_registry import registry  # also puts the vendored YOLOv5 on sys.path
+from utils.general import Profile
+
+# Upper bounds in seconds; the last bucket (+Inf) is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_NAME = 'lpd_stage_duration_seconds'
+
+_trace = contextvars.ContextVar('stage_trace', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total, out = 0, []
+        for le, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            out.append((le, total))
+        return out
+
+
+class StageTimer(Profile):
+    """Profile that records its duration into a StageMetrics histogram on exit (also when the stage raised)."""
+
+    def __init__(self, metrics, name, device=None):
+        super().__init__(device=device)
+        self.metrics = metrics
+        self.name = name
+
+    def __exit__(self, type, value, traceback):
+        super().__exit__(type, value, traceback)
+        self.metrics.observe(self.name, self.dt)
+
+
+class StageMetrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name, model=False):
+        """Context manager timing one stage; model=True synchronizes the model device around it."""
+        return StageTimer(self, name, registry.device if model else None)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(self.buckets)
+            self._histograms[name].observe(seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, seconds))
+
+    def start_trace(self):
+        """Collect the stages run by the current thread/context (until the next start_trace)."""
+        _trace.set([])
+
+    def trace(self):
+        return list(_trace.get() or [])
+
+    def server_timing(self):
+        """Server-Timing header value for the stages of the current trace, durations in ms."""
+        return ', '.join(f'{name};dur={seconds * 1e3:.2f}' for name, seconds in self.trace())
+
+    def prometheus_text(self):
+        with self._lock:
+            snapshot = {name: (h.cumulative(), h.sum, h.count) for name, h in sorted(self._histograms.items())}
+        lines = [f'# HELP {METRIC_NAME} Latency of plate pipeline and request handler stages.',
+                 f'# TYPE {METRIC_NAME} histogram']
+        for name, (buckets, total, count) in snapshot.items():
+            for le, n in buckets:
+                le = '+Inf' if le == float('inf') else repr(le)
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{le}"}} {n}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {total}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+stage_metrics = StageMetrics()
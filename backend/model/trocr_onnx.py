@@ -0,0 +1,194 @@
+"""
+ONNX Runtime backend for TrOCR.
+
+The VisionEncoderDecoderModel is exported as three graphs:
+  encoder.onnx            pixel_values -> encoder_hidden_states (projected to the decoder width)
+  decoder_init.onnx       first decoder step, returns logits and the self/cross attention key/values
+  decoder_with_past.onnx  one decoder step that reuses the cached key/values
+
+OnnxTrOCR runs greedy decoding over these graphs and exposes a generate() compatible with the way LPD2 calls
+VisionEncoderDecoderModel.generate(), so it can be dropped into the model registry.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch import nn
+
+META_FILE = 'trocr_onnx.json'
+
+
+def _flatten_past(past_key_values, self_only=False):
+    # Per layer: (self_key, self_value, cross_key, cross_value)
+    return tuple(t for layer in past_key_values for t in (layer[:2] if self_only else layer))
+
+
+def _past_names(prefix, num_layers, self_only=False):
+    kinds = ('self_key', 'self_value') if self_only else ('self_key', 'self_value', 'cross_key', 'cross_value')
+    return [f"{prefix}_{i}_{kind}" for i in range(num_layers) for kind in kinds]
+
+
+class _EncoderWrapper(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.encoder
+        self.enc_to_dec_proj = getattr(model, 'enc_to_dec_proj', None)
+
+    def forward(self, pixel_values):
+        hidden = self.encoder(pixel_values=pixel_values, return_dict=True).last_hidden_state
+        if self.enc_to_dec_proj is not None:
+            hidden = self.enc_to_dec_proj(hidden)
+        return hidden
+
+
+class _DecoderInitWrapper(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.decoder = model.decoder
+
+    def forward(self, input_ids, encoder_hidden_states):
+        out = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states, use_cache=True,
+                           return_dict=True)
+        return (out.logits,) + _flatten_past(out.past_key_values)
+
+
+class _DecoderWithPastWrapper(nn.Module):
+    def __init__(self, model, num_layers):
+        super().__init__()
+        self.decoder = model.decoder
+        self.num_layers = num_layers
+
+    def forward(self, input_ids, encoder_hidden_states, *past):
+        # encoder_hidden_states only switches the cross-attention blocks on: their key/values come from the cache, so
+        # the exporter drops the input from the graph and OnnxTrOCR feeds whatever inputs the graph declares
+        past_key_values = tuple(tuple(past[i * 4:(i + 1) * 4]) for i in range(self.num_layers))
+        out = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states,
+                           past_key_values=past_key_values, use_cache=True, return_dict=True)
+        # Cross-attention key/values never change after the first step, so only the self-attention cache is returned
+        return (out.logits,) + _flatten_past(out.past_key_values, self_only=True)
+
+
+@torch.no_grad()
+def export_trocr_onnx(model, out_dir, opset=14, image_size=384):
+    """Export a fp32 TrOCR VisionEncoderDecoderModel to encoder/decoder ONNX graphs in out_dir."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model = model.to('cpu').eval()
+    num_layers = model.decoder.config.decoder_layers
+    gen = model.generation_config
+    start_id = gen.decoder_start_token_id if gen.decoder_start_token_id is not None else model.config.decoder_start_token_id
+    meta = {
+        'num_layers': num_layers,
+        'decoder_start_token_id': start_id,
+        'eos_token_id': gen.eos_token_id if gen.eos_token_id is not None else model.config.eos_token_id,
+        'pad_token_id': gen.pad_token_id if gen.pad_token_id is not None else model.config.pad_token_id,
+        'max_length': gen.max_length,
+    }
+
+    pixel_values = torch.zeros(1, 3, image_size, image_size)
+    encoder = _EncoderWrapper(model)
+    torch.onnx.export(encoder, (pixel_values,), str(out_dir / 'encoder.onnx'), opset_version=opset, dynamo=False,
+                      input_names=['pixel_values'], output_names=['encoder_hidden_states'],
+                      dynamic_axes={'pixel_values': {0: 'batch'}, 'encoder_hidden_states': {0: 'batch', 1: 'enc_seq'}})
+
+    hidden = encoder(pixel_values)
+    input_ids = torch.full((1, 1), start_id, dtype=torch.long)
+    present = _past_names('present', num_layers)
+    seq_axes = {0: 'batch', 2: 'past_seq'}
+    torch.onnx.export(_DecoderInitWrapper(model), (input_ids, hidden), str(out_dir / 'decoder_init.onnx'),
+                      opset_version=opset, dynamo=False, input_names=['input_ids', 'encoder_hidden_states'],
+                      output_names=['logits'] + present,
+                      dynamic_axes={'input_ids': {0: 'batch', 1: 'seq'},
+                                    'encoder_hidden_states': {0: 'batch', 1: 'enc_seq'},
+                                    'logits': {0: 'batch', 1: 'seq'},
+                                    **{name: seq_axes for name in present}})
+
+    init_out = _DecoderInitWrapper(model)(input_ids, hidden)
+    past_in = _past_names('past', num_layers)
+    present_self = _past_names('present', num_layers, self_only=True)
+    torch.onnx.export(_DecoderWithPastWrapper(model, num_layers), (input_ids, hidden, *init_out[1:]),
+                      str(out_dir / 'decoder_with_past.onnx'), opset_version=opset, dynamo=False,
+                      input_names=['input_ids', 'encoder_hidden_states'] + past_in,
+                      output_names=['logits'] + present_self,
+                      dynamic_axes={'input_ids': {0: 'batch'},
+                                    'encoder_hidden_states': {0: 'batch', 1: 'enc_seq'},
+                                    'logits': {0: 'batch'},
+                                    **{name: seq_axes for name in past_in + present_self}})
+
+    (out_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+    return out_dir
+
+
+def is_exported(onnx_dir):
+    onnx_dir = Path(onnx_dir)
+    files = ('encoder.onnx', 'decoder_init.onnx', 'decoder_with_past.onnx', META_FILE)
+    return all((onnx_dir / f).is_file() for f in files)
+
+
+class OnnxTrOCR:
+    """Greedy TrOCR decoding on ONNX Runtime with key/value cache reuse."""
+
+    def __init__(self, onnx_dir, providers=None):
+        import onnxruntime
+
+        onnx_dir = Path(onnx_dir)
+        self.meta = json.loads((onnx_dir / META_FILE).read_text())
+        self.num_layers = self.meta['num_layers']
+        providers = providers or ['CPUExecutionProvider']
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.encoder = onnxruntime.InferenceSession(str(onnx_dir / 'encoder.onnx'), options, providers=providers)
+        self.decoder_init = onnxruntime.InferenceSession(str(onnx_dir / 'decoder_init.onnx'), options,
+                                                         providers=providers)
+        self.decoder_with_past = onnxruntime.InferenceSession(str(onnx_dir / 'decoder_with_past.onnx'), options,
+                                                              providers=providers)
+        self.past_names = _past_names('past', self.num_layers)
+        self.with_past_inputs = {i.name for i in self.decoder_with_past.get_inputs()}
+
+    def generate(self, pixel_values, max_new_tokens=None, allowed_token_ids=None, **generate_kwargs):
+        """
+        Greedy decode a batch; returns token ids (including the start token) like model.generate().
+        allowed_token_ids restricts every step to that vocabulary; other generate() options are ignored (always greedy).
+        """
+        if isinstance(pixel_values, torch.Tensor):
+            pixel_values = pixel_values.detach().cpu().numpy()
+        pixel_values = pixel_values.astype(np.float32, copy=False)
+        max_new_tokens = max_new_tokens or self.meta['max_length'] - 1
+        start_id, eos_id, pad_id = (self.meta['decoder_start_token_id'], self.meta['eos_token_id'],
+                                    self.meta['pad_token_id'])
+
+        hidden = self.encoder.run(None, {'pixel_values': pixel_values})[0]
+        batch = hidden.shape[0]
+        input_ids = np.full((batch, 1), start_id, dtype=np.int64)
+        outputs = self.decoder_init.run(None, {'input_ids': input_ids, 'encoder_hidden_states': hidden})
+        logits, present = outputs[0], outputs[1:]
+        self_kv = [t for i in range(self.num_layers) for t in present[i * 4:i * 4 + 2]]
+        cross_kv = [present[i * 4 + 2:i * 4 + 4] for i in range(self.num_layers)]
+
+        vocab_mask = None
+        if allowed_token_ids is not None:
+            vocab_mask = np.full(logits.shape[-1], -np.inf, dtype=np.float32)
+            vocab_mask[list(allowed_token_ids)] = 0.0
+
+        tokens = [input_ids]
+        finished = np.zeros(batch, dtype=bool)
+        for _ in range(max_new_tokens):
+            step_logits = logits[:, -1] if vocab_mask is None else logits[:, -1] + vocab_mask
+            next_ids = step_logits.argmax(-1)
+            next_ids = np.where(finished, pad_id, next_ids).astype(np.int64)
+            tokens.append(next_ids[:, None])
+            finished |= next_ids == eos_id
+            if finished.all():
+                break
+            feed = {'input_ids': next_ids[:, None]}
+            if 'encoder_hidden_states' in self.with_past_inputs:
+                feed['encoder_hidden_states'] = hidden
+            for i in range(self.num_layers):
+                names = self.past_names[i * 4:(i + 1) * 4]
+                feed[names[0]], feed[names[1]] = self_kv[i * 2], self_kv[i * 2 + 1]
+                feed[names[2]], feed[names[3]] = cross_kv[i]
+            outputs = self.decoder_with_past.run(None, feed)
+            logits, self_kv = outputs[0], outputs[1:]
+        return torch.from_numpy(np.concatenate(tokens, axis=1))
@@ -1008,6 +1008,20 @@ def clip_segments(segments, shape):
         segments[:, 1] = segments[:, 1].clip(0, shape[0])  # y
 
 
+def _top1_single_class(prediction, conf_thres, nm=0, device=None):
+    """Top-1 detection per image for a single-class model; same result as the first row of non_max_suppression()."""
+    conf = prediction[..., 4] * prediction[..., 5]  # obj_conf * cls_conf, (bs, n)
+    conf = conf.masked_fill((prediction[..., 4] <= conf_thres) | (conf <= conf_thres), -1.0)
+    best, i = conf.max(1)  # (bs,)
+    rows = prediction[torch.arange(prediction.shape[0], device=prediction.device), i]  # (bs, 6 + nm)
+    masks = rows[:, 6 : 6 + nm] * rows[:, 4:5]  # scaled by obj_conf like every column after it in the NMS path
+    x = torch.cat((xywh2xyxy(rows[:, :4]), best[:, None], torch.zeros_like(best)[:, None], masks), 1)
+    if device is not None:
+        x = x.to(device)
+    keep = (best > conf_thres).tolist()
+    return [x[j : j + 1] if k else x[j : j] for j, k in enumerate(keep)]
+
+
 def non_max_suppression(
     prediction,
     conf_thres=0.25,
@@ -1018,6 +1032,7 @@ def non_max_suppression(
     labels=(),
     max_det=300,
     nm=0,  # number of masks
+    topk=None,  # None or 1; 1 keeps only the best box per image of a single-class model, without running NMS
 ):
     """
     Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
@@ -1028,6 +1043,8 @@ def non_max_suppression(
     # Checks
     assert 0 <= conf_thres <= 1, f"Invalid Confidence threshold {conf_thres}, valid values are between 0.0 and 1.0"
     assert 0 <= iou_thres <= 1, f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
+    if topk not in (None, 1):
+        raise ValueError(f"Invalid topk {topk}, only None and 1 are supported")
     if isinstance(prediction, (list, tuple)):  # YOLOv5 model in validation model, output = (inference_out, loss_out)
         prediction = prediction[0]  # select only inference output
 
@@ -1050,6 +1067,9 @@ def non_max_suppression(
 
     t = time.time()
     mi = 5 + nc  # mask start index
+    if topk == 1 and nc == 1 and not labels and classes is None:
+        # Best box per image, vectorized over the batch (NMS always keeps the top-scoring box)
+        return _top1_single_class(prediction, conf_thres, nm, device if mps else None)
     output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
     for xi, x in enumerate(prediction):  # image index, image inference
         # Apply constraints
@@ -0,0 +1,140 @@
+"""
+Indexed plate search.
+
+plate_ngrams holds, for every known plate, the substrings starting at each position (up to 3 characters long).
+Any substring query of 3+ characters is answered by intersecting its trigrams, and shorter queries are prefixes
+of some stored gram, so no search needs a leading-wildcard scan of parking_logs. Fuzzy search ranks candidates
+sharing trigrams with the query by an edit distance that treats common OCR confusions as cheap substitutions.
+"""
+
+from LPD2 import DIGIT_TO_ALPHA
+
+GRAM_SIZE = 3
+MAX_CANDIDATES = 500
+SEARCH_MODES = ('exact', 'prefix', 'contains', 'fuzzy')
+
+NGRAM_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS plate_ngrams (
+        gram VARCHAR(3) NOT NULL,
+        plate VARCHAR(20) NOT NULL,
+        PRIMARY KEY (gram, plate),
+        INDEX idx_ngram_plate (plate)
+    )
+"""
+
+# Substituting one of these for the other costs half an edit
+OCR_CONFUSIONS = {pair for d, a in DIGIT_TO_ALPHA.items() for pair in ((d, a), (a, d))}
+CONFUSION_COST = 0.5
+
+
+def plate_grams(plate):
+    return {plate[i:i + GRAM_SIZE] for i in range(len(plate))}
+
+
+def query_trigrams(query):
+    return {query[i:i + GRAM_SIZE] for i in range(len(query) - GRAM_SIZE + 1)}
+
+
+def ensure_schema(cursor):
+    cursor.execute(NGRAM_TABLE_SQL)
+    cursor.execute("SELECT 1 FROM plate_ngrams LIMIT 1")
+    if not cursor.fetchone():
+        backfill(cursor)
+
+
+def backfill(cursor, max_plate_length=20):
+    """Index every plate already in parking_logs with set-based inserts (one per character position)."""
+    for i in range(max_plate_length):
+        cursor.execute("""
+            INSERT IGNORE INTO plate_ngrams (gram, plate)
+            SELECT DISTINCT SUBSTRING(plate, %s, %s), plate FROM parking_logs WHERE CHAR_LENGTH(plate) > %s
+        """, (i + 1, GRAM_SIZE, i))
+
+
+def index_plate(cursor, plate):
+    """Add a plate to the index. Call in the transaction that inserts its parking_logs row."""
+    index_plates(cursor, [plate])
+
+
+def index_plates(cursor, plates):
+    cursor.executemany(
+        "INSERT IGNORE INTO plate_ngrams (gram, plate) VALUES (%s, %s)",
+        [(gram, plate) for plate in set(plates) for gram in plate_grams(plate)]
+    )
+
+
+def ocr_edit_distance(a, b):
+    """Levenshtein distance where OCR-confusable characters (e.g. 8/B, 0/D) substitute at half cost."""
+    a, b = a.upper(), b.upper()
+    prev = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        cur = [float(i)]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sub = 0.0
+            elif (ca, cb) in OCR_CONFUSIONS:
+                sub = CONFUSION_COST
+            else:
+                sub = 1.0
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + sub))
+        prev = cur
+    return prev[-1]
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def find_plates(cursor, query, mode='contains', max_distance=1.0):
+    """
+    Distinct plates matching `query`, as a list of (plate, distance) pairs (distance is 0 except in fuzzy mode).
+    """
+    query = query.strip().upper()
+    if not query:
+        return []
+
+    if mode == 'exact':
+        cursor.execute("SELECT plate FROM plate_ngrams WHERE plate = %s LIMIT 1", (query,))
+        return [(row[0], 0) for row in cursor.fetchall()]
+
+    if mode == 'prefix':
+        cursor.execute(
+            "SELECT DISTINCT plate FROM plate_ngrams WHERE plate LIKE %s LIMIT %s",
+            (_escape_like(query) + '%', MAX_CANDIDATES)
+        )
+        return [(row[0], 0) for row in cursor.fetchall()]
+
+    if mode == 'contains':
+        trigrams = query_trigrams(query)
+        if trigrams:
+            placeholders = ', '.join(['%s'] * len(trigrams))
+            cursor.execute(
+                f"SELECT plate FROM plate_ngrams WHERE gram IN ({placeholders}) "
+                f"GROUP BY plate HAVING COUNT(*) = %s LIMIT %s",
+                (*trigrams, len(trigrams), MAX_CANDIDATES)
+            )
+        else:
+            # Shorter than a trigram: the query is a prefix of the gram starting where it occurs
+            cursor.execute(
+                "SELECT DISTINCT plate FROM plate_ngrams WHERE gram LIKE %s LIMIT %s",
+                (_escape_like(query) + '%', MAX_CANDIDATES)
+            )
+        # Trigrams can match out of order, so confirm the substring
+        return [(row[0], 0) for row in cursor.fetchall() if query in row[0].upper()]
+
+    if mode == 'fuzzy':
+        grams = query_trigrams(query) or {query}
+        placeholders = ', '.join(['%s'] * len(grams))
+        cursor.execute(
+            f"SELECT plate FROM plate_ngrams WHERE gram IN ({placeholders}) "
+            f"GROUP BY plate ORDER BY COUNT(*) DESC LIMIT %s",
+            (*grams, MAX_CANDIDATES)
+        )
+        matches = []
+        for (plate,) in cursor.fetchall():
+            distance = ocr_edit_distance(query, plate)
+            if distance <= max_distance:
+                matches.append((plate, distance))
+        return sorted(matches, key=lambda m: m[1])
+
+    raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
@@ -0,0 +1,141 @@
+"""
+Dashboard statistics kept as running counters in a one-row summary table.
+
+The entry/exit handlers update the counters in the same transaction as their parking_logs change, so /get-stats
+reads a single row instead of aggregating the whole history. A periodic full recompute corrects any drift
+(manual edits, failed requests, day rollover).
+"""
+
+import threading
+import time
+
+import mysql.connector
+
+# Same revenue rule as the dashboard always used: ignore fares above 1000
+MAX_COUNTED_FARE = 1000
+
+SUMMARY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS parking_stats_summary (
+        id TINYINT PRIMARY KEY,
+        total_records INT NOT NULL DEFAULT 0,
+        active_parkings INT NOT NULL DEFAULT 0,
+        completed_parkings INT NOT NULL DEFAULT 0,
+        total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        total_duration_minutes BIGINT NOT NULL DEFAULT 0,
+        today_date DATE NULL,
+        today_entries INT NOT NULL DEFAULT 0,
+        refreshed_at DATETIME NULL
+    )
+"""
+
+
+def ensure_schema(cursor):
+    cursor.execute(SUMMARY_TABLE_SQL)
+    cursor.execute("INSERT IGNORE INTO parking_stats_summary (id) VALUES (1)")
+
+
+def record_entry(cursor, entry_time, count=1):
+    """Count new parking entries at entry_time. Call inside the transaction that inserts the parking_logs rows."""
+    day = entry_time.date()
+    cursor.execute("""
+        UPDATE parking_stats_summary
+        SET total_records = total_records + %s,
+            active_parkings = active_parkings + %s,
+            today_entries = CASE
+                WHEN today_date = %s THEN today_entries + %s
+                WHEN today_date IS NULL OR today_date < %s THEN %s
+                ELSE today_entries
+            END,
+            today_date = GREATEST(COALESCE(today_date, %s), %s)
+        WHERE id = 1
+    """, (count, count, day, count, day, count, day, day))
+
+
+def record_exit(cursor, duration_min, fare):
+    """Count a completed parking. Call inside the transaction that sets exit_time and fare."""
+    record_exits(cursor, [(duration_min, fare)])
+
+
+def record_exits(cursor, exits):
+    """Count completed parkings given as (duration_min, fare) pairs, with one summary update."""
+    counted_fare = sum(fare if fare <= MAX_COUNTED_FARE else 0 for _, fare in exits)
+    duration = sum(duration_min for duration_min, _ in exits)
+    cursor.execute("""
+        UPDATE parking_stats_summary
+        SET active_parkings = active_parkings - %s,
+            completed_parkings = completed_parkings + %s,
+            total_revenue = total_revenue + %s,
+            total_duration_minutes = total_duration_minutes + %s
+        WHERE id = 1
+    """, (len(exits), len(exits), counted_fare, duration))
+
+
+def read_stats(cursor):
+    """Current dashboard statistics from the summary row, or None if it does not exist."""
+    cursor.execute("""
+        SELECT total_records, active_parkings, completed_parkings, total_revenue,
+               total_duration_minutes,
+               IF(today_date = CURDATE(), today_entries, 0) AS today_entries
+        FROM parking_stats_summary
+        WHERE id = 1
+    """)
+    row = cursor.fetchone()
+    if not row:
+        return None
+    completed = row['completed_parkings'] or 0
+    row['avg_duration_minutes'] = row['total_duration_minutes'] / completed if completed else 0
+    return row
+
+
+def recompute(db):
+    """Rebuild the counters from parking_logs with a full aggregate."""
+    cursor = db.cursor()
+    try:
+        # Lock the summary row first so entry/exit updates wait instead of being lost or counted twice
+        cursor.execute("SELECT id FROM parking_stats_summary WHERE id = 1 FOR UPDATE")
+        cursor.fetchall()
+        cursor.execute("""
+            UPDATE parking_stats_summary s
+            JOIN (
+                SELECT
+                    COUNT(*) AS total_records,
+                    COALESCE(SUM(CASE WHEN exit_time IS NULL THEN 1 ELSE 0 END), 0) AS active_parkings,
+                    COALESCE(SUM(CASE WHEN exit_time IS NOT NULL THEN 1 ELSE 0 END), 0) AS completed_parkings,
+                    COALESCE(SUM(CASE WHEN fare <= %s THEN fare ELSE 0 END), 0) AS total_revenue,
+                    COALESCE(SUM(TIMESTAMPDIFF(MINUTE, entry_time, exit_time)), 0) AS total_duration_minutes,
+                    COALESCE(SUM(CASE WHEN DATE(entry_time) = CURDATE() THEN 1 ELSE 0 END), 0) AS today_entries
+                FROM parking_logs
+            ) a
+            SET s.total_records = a.total_records,
+                s.active_parkings = a.active_parkings,
+                s.completed_parkings = a.completed_parkings,
+                s.total_revenue = a.total_revenue,
+                s.total_duration_minutes = a.total_duration_minutes,
+                s.today_date = CURDATE(),
+                s.today_entries = a.today_entries,
+                s.refreshed_at = NOW()
+            WHERE s.id = 1
+        """, (MAX_COUNTED_FARE,))
+        db.commit()
+    finally:
+        cursor.close()
+
+
+def start_refresher(get_db, interval):
+    """Recompute the counters every `interval` seconds in a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            db = get_db()
+            if not db:
+                continue
+            try:
+                recompute(db)
+            except mysql.connector.Error as err:
+                print(f"Stats refresh error: {err}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=run, name='stats-refresher', daemon=True)
+    thread.start()
+    return thread
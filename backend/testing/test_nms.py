@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'model', 'yolov5'))
+from utils.general import non_max_suppression
+
+
+def single_class_prediction(bs=4, n=300, nm=0, seed=0):
+    """Raw single-class YOLOv5 output: (bs, n, 6 + nm) rows of xywh, objectness, class score and mask coefficients."""
+    g = torch.Generator().manual_seed(seed)
+    xy = torch.rand(bs, n, 2, generator=g) * 640
+    wh = torch.rand(bs, n, 2, generator=g) * 120 + 4
+    scores = torch.rand(bs, n, 2, generator=g)
+    masks = torch.randn(bs, n, nm, generator=g)
+    return torch.cat((xy, wh, scores, masks), 2)
+
+
+@pytest.mark.parametrize("nm", [0, 3])
+def test_top1_matches_first_row_of_nms(nm):
+    prediction = single_class_prediction(nm=nm)
+    prediction[1, :, 4] = 0.1  # an image where nothing passes the confidence threshold
+    expected = non_max_suppression(prediction.clone(), 0.25, 0.45, nm=nm)
+    actual = non_max_suppression(prediction.clone(), 0.25, 0.45, nm=nm, topk=1)
+
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert got.shape == want[:1].shape
+        torch.testing.assert_close(got, want[:1])
+    assert actual[1].shape[0] == 0
+
+
+def test_topk_other_than_one_is_rejected():
+    with pytest.raises(ValueError):
+        non_max_suppression(single_class_prediction(), topk=5)
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'model'))
+from trocr_onnx import OnnxTrOCR, export_trocr_onnx
+
+IMAGE_SIZE = 32
+
+
+def tiny_trocr():
+    """Small randomly initialized ViT + TrOCR model with the structure of the real checkpoint."""
+    torch.manual_seed(0)
+    encoder = transformers.ViTConfig(image_size=IMAGE_SIZE, patch_size=16, hidden_size=32, num_hidden_layers=2,
+                                     num_attention_heads=2, intermediate_size=37)
+    decoder = transformers.TrOCRConfig(vocab_size=99, d_model=24, decoder_layers=2, decoder_attention_heads=2,
+                                       decoder_ffn_dim=37, max_position_embeddings=64, bos_token_id=0,
+                                       pad_token_id=1, eos_token_id=2, decoder_start_token_id=0)
+    config = transformers.VisionEncoderDecoderConfig.from_encoder_decoder_configs(encoder, decoder)
+    config.decoder_start_token_id, config.pad_token_id, config.eos_token_id = 0, 1, 2
+    model = transformers.VisionEncoderDecoderModel(config=config).eval()
+    model.generation_config.decoder_start_token_id = 0
+    model.generation_config.pad_token_id = 1
+    model.generation_config.eos_token_id = 2
+    return model
+
+
+def test_onnx_greedy_matches_generate(tmp_path):
+    model = tiny_trocr()
+    export_trocr_onnx(model, tmp_path, image_size=IMAGE_SIZE)
+    onnx_model = OnnxTrOCR(tmp_path)
+
+    pixel_values = torch.randn(3, 3, IMAGE_SIZE, IMAGE_SIZE)
+    with torch.no_grad():
+        expected = model.generate(pixel_values, max_new_tokens=12, num_beams=1, do_sample=False)
+    actual = onnx_model.generate(pixel_values, max_new_tokens=12)
+
+    # Several decoding steps ran, so the cached decoder graph was exercised
+    assert expected.shape[1] > 2
+    assert torch.equal(actual, expected)
@@ -19,7 +19,11 @@ CREATE TABLE IF NOT EXISTS parking_logs (
     fare DECIMAL(10,2) DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     INDEX idx_plate (plate),
-    INDEX idx_entry_time (entry_time)
+    INDEX idx_entry_time (entry_time),
+    INDEX idx_logs_keyset (entry_time, id, exit_time, plate, fare),
+    INDEX idx_logs_status_keyset (exit_time, entry_time, id),  -- active (exit_time IS NULL) pages
+    INDEX idx_logs_plate_keyset (plate, entry_time, id),
+    INDEX idx_logs_active (plate, exit_time, entry_time)
 );
 
 -- Dashboard view
@@ -31,4 +35,25 @@ SELECT
     COALESCE(AVG(TIMESTAMPDIFF(MINUTE, entry_time, exit_time)), 0) as avg_duration_minutes,
     COALESCE(SUM(fare), 0) as total_revenue,
     COUNT(CASE WHEN DATE(entry_time) = CURDATE() THEN 1 END) as today_entries
-FROM parking_logs;
\ No newline at end of file
+FROM parking_logs;
+-- Running dashboard counters (kept up to date by the backend, rebuilt periodically from parking_logs)
+CREATE TABLE IF NOT EXISTS parking_stats_summary (
+    id TINYINT PRIMARY KEY,
+    total_records INT NOT NULL DEFAULT 0,
+    active_parkings INT NOT NULL DEFAULT 0,
+    completed_parkings INT NOT NULL DEFAULT 0,
+    total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    total_duration_minutes BIGINT NOT NULL DEFAULT 0,
+    today_date DATE NULL,
+    today_entries INT NOT NULL DEFAULT 0,
+    refreshed_at DATETIME NULL
+);
+INSERT IGNORE INTO parking_stats_summary (id) VALUES (1);
+
+-- Plate search index: substrings (up to 3 characters) starting at every position of each plate
+CREATE TABLE IF NOT EXISTS plate_ngrams (
+    gram VARCHAR(3) NOT NULL,
+    plate VARCHAR(20) NOT NULL,
+    PRIMARY KEY (gram, plate),
+    INDEX idx_ngram_plate (plate)
+);